@@ -0,0 +1,165 @@
+"""
+Shared setup of the benchmarks. The benchmarks run in process against the
+test project in ``src/merlin/tests/fixtures/testproject``, with an in memory
+SQLite database and the Django test client, so they need no server and no
+network access.
+"""
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for path in (ROOT, os.path.join(ROOT, 'src')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'file': 'django.contrib.sessions.backends.file',
+}
+
+# The data posted to each step of the bettertest wizard of the test project.
+PROJECT_DATA = {
+    'user-details': {
+        'first_name': 'Chad',
+        'last_name': 'Gallemore',
+        'email': 'cgallemore@gmail.com'
+    },
+    'few-more-things': {
+        'bio': 'My bio'
+    },
+    'social-info': {
+        'twitter': 'http://twitter.com/localbase',
+        'facebook': 'http://facebook.com/localbase'
+    },
+}
+
+
+def setup(database=None, **overrides):
+    """
+    Configures Django with the settings of the test project, creates the
+    tables and returns the settings. ``overrides`` are set on the settings.
+    The SQLite database is kept in memory unless a ``database`` file name is
+    given.
+    """
+    from django.core.management import setup_environ
+    from merlin.tests.fixtures.testproject import settings as project
+
+    setup_environ(project)
+
+    from django.conf import settings
+    from django.core.management import call_command
+
+    settings.DEBUG = False
+    settings.TEMPLATE_DEBUG = False
+    settings.ROOT_URLCONF = 'benchmarks.urls'
+
+    if database is not None:
+        settings.DATABASES['default']['NAME'] = database
+
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+
+    call_command('syncdb', interactive=False, verbosity=0)
+
+    return settings
+
+
+def use_session_engine(name):
+    """
+    Switches the session backend used by the following requests.
+    """
+    from django.conf import settings
+
+    settings.SESSION_ENGINE = SESSION_ENGINES[name]
+
+
+def percentile(values, percent):
+    """
+    Returns the value below which ``percent`` percent of ``values`` fall,
+    using the nearest rank.
+    """
+    values = sorted(values)
+    index = int(round(percent / 100.0 * (len(values) - 1)))
+
+    return values[index]
+
+
+def summarize(durations):
+    """
+    Returns the count, mean, p50 and p99 in milliseconds of a list of
+    durations in seconds.
+    """
+    if not durations:
+        return {'count': 0}
+
+    return {
+        'count': len(durations),
+        'mean': 1000.0 * sum(durations) / len(durations),
+        'p50': 1000.0 * percentile(durations, 50),
+        'p99': 1000.0 * percentile(durations, 99),
+    }
+
+
+def environment():
+    """
+    Returns a description of the environment the benchmark ran in, stored
+    with the results so they can be compared between versions.
+    """
+    import django
+
+    try:
+        revision = subprocess.Popen(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0]
+
+    except OSError:
+        revision = ''
+
+    return {
+        'date': datetime.now().isoformat(),
+        'revision': revision.strip() or None,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+    }
+
+
+def parse_list(value, cast=str):
+    """
+    Parses a comma separated command line option.
+    """
+    return [cast(item) for item in value.split(',') if item]
+
+
+def run_flow(client, url_base, slug, get_data, record):
+    """
+    Walks a wizard from the step ``slug`` to the end with the test
+    ``client``, sending a GET and a POST of ``get_data(slug)`` to every
+    step and following the redirects of the wizard. ``record`` is called
+    with the method, the slug, the duration and the response of every
+    request. Returns the response of the last request.
+    """
+    from timeit import default_timer
+
+    while True:
+        url = url_base + slug
+
+        start = default_timer()
+        response = client.get(url)
+        record('GET', slug, default_timer() - start, response)
+
+        start = default_timer()
+        response = client.post(url, get_data(slug))
+        record('POST', slug, default_timer() - start, response)
+
+        if response.status_code != 302:
+            return response
+
+        slug = response['Location'].rsplit('/', 1)[-1]
@@ -0,0 +1,54 @@
+"""
+Compares two JSON result files written by ``benchmarks.throughput``::
+
+    python -m benchmarks.compare before.json after.json
+
+Prints the change of the requests per second and of the p50 and p99 latency
+of GET and POST for every configuration found in both files.
+"""
+import argparse
+import json
+import sys
+
+
+def _key(result):
+    return tuple(sorted(result['params'].items()))
+
+
+def _change(before, after):
+    if not before:
+        return '     n/a'
+
+    return '%+7.1f%%' % (100.0 * (after - before) / before)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    options = parser.parse_args(argv)
+
+    with open(options.before) as stream:
+        before = dict((_key(result), result)
+            for result in json.load(stream)['results'])
+
+    with open(options.after) as stream:
+        after = dict((_key(result), result)
+            for result in json.load(stream)['results'])
+
+    sys.stdout.write('%-72s %9s %9s %9s %9s %9s\n' % ('configuration',
+        'req/s', 'GET p50', 'GET p99', 'POST p50', 'POST p99'))
+
+    for key in sorted(set(before) & set(after)):
+        old, new = before[key], after[key]
+        sys.stdout.write('%-72s %9s %9s %9s %9s %9s\n' % (
+            ' '.join('%s=%s' % item for item in key),
+            _change(old['requests_per_second'], new['requests_per_second']),
+            _change(old['GET']['p50'], new['GET']['p50']),
+            _change(old['GET']['p99'], new['GET']['p99']),
+            _change(old['POST']['p50'], new['POST']['p50']),
+            _change(old['POST']['p99'], new['POST']['p99'])))
+
+
+if __name__ == '__main__':
+    main()
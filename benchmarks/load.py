@@ -0,0 +1,290 @@
+"""
+Runs many simulated users through the generated wizards at the same time,
+with a pool of processes sharing one SQLite database file, to see how the
+wizards behave under concurrency.
+
+Run it from the root of the repository::
+
+    python -m benchmarks.load --users 2000 --processes 8 --output load.json
+
+Every user walks a wizard whose steps insert and remove steps as they are
+posted, going back to an earlier step and posting it again now and then,
+and sometimes cancelling the wizard half way. The throughput, the error
+rate, the latency, the number of writes to the state store and the size of
+the wizard state are reported as JSON. Everything runs offline against a
+temporary SQLite database and the local memory cache.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+from timeit import default_timer
+
+from benchmarks import common
+
+
+STATE_STORES = {
+    'session': 'merlin.wizards.stores.SessionStateStore',
+    'cache': 'merlin.wizards.stores.CacheStateStore',
+    'event_log': 'merlin.wizards.stores.EventLogStateStore',
+}
+
+# Counters of the current worker process, read before and after every user.
+_writes = {'save': 0, 'delete': 0}
+_state_sizes = []
+
+
+class CountingStateStore(object):
+    """
+    Wraps the state store chosen with ``--state-store`` and counts its
+    writes.
+    """
+    def __init__(self):
+        from django.conf import settings
+        from merlin.wizards.utils import import_class
+
+        self.store = import_class(settings.BENCHMARK_STATE_STORE)()
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def save(self, request, wizard_id, state):
+        _writes['save'] += 1
+
+        return self.store.save(request, wizard_id, state)
+
+    def delete(self, request, wizard_id):
+        _writes['delete'] += 1
+
+        return self.store.delete(request, wizard_id)
+
+
+class StateSizeSink(object):
+    """
+    Metrics sink keeping the sizes of the wizard state.
+    """
+    def timing(self, name, duration, tags):
+        pass
+
+    def gauge(self, name, value, tags):
+        if name == 'state_size':
+            _state_sizes.append(value)
+
+
+def _init_worker():
+    from django.db import connection
+
+    # Every process opens its own connection to the database file.
+    connection.close()
+
+
+def simulate_user(args):
+    """
+    Walks one simulated user through a wizard and returns what happened.
+    """
+    from django.test.client import Client
+    from benchmarks.wizards import get_form_data
+    # The counters of the module named in the settings, which is not this
+    # one when the harness is run with ``python -m``.
+    from benchmarks.load import _writes, _state_sizes
+
+    index, options = args
+    rng = random.Random(options['seed'] + index)
+    client = Client()
+    data = get_form_data(options['form_size'])
+    url_base = '/benchmark/%d/%d/1/' % (options['length'],
+        options['form_size'])
+    writes = dict(_writes)
+    del _state_sizes[:]
+    result = {'GET': [], 'POST': [], 'errors': 0, 'outcome': 'done'}
+
+    def request(method, slug):
+        start = default_timer()
+
+        try:
+            if method == 'GET':
+                response = client.get(url_base + slug)
+
+            else:
+                response = client.post(url_base + slug, data)
+
+        except Exception:
+            result['errors'] += 1
+            response = None
+
+        else:
+            if response.status_code >= 500:
+                result['errors'] += 1
+                response = None
+
+        result[method].append(default_timer() - start)
+
+        return response
+
+    visited = []
+    slug = 'step-0'
+    start = default_timer()
+
+    while True:
+        if visited and rng.random() < options['cancel']:
+            request('GET', 'cancel')
+            result['outcome'] = 'cancelled'
+            break
+
+        if visited and rng.random() < options['back']:
+            previous = rng.choice(visited)
+
+            if request('GET', previous) is None or \
+                    request('POST', previous) is None:
+                result['outcome'] = 'failed'
+                break
+
+        if request('GET', slug) is None:
+            result['outcome'] = 'failed'
+            break
+
+        response = request('POST', slug)
+
+        if response is None or response.status_code not in (200, 302):
+            result['outcome'] = 'failed'
+            break
+
+        if response.status_code == 200:
+            if response.content != 'done':
+                result['outcome'] = 'failed'
+
+            break
+
+        visited.append(slug)
+        slug = response['Location'].rsplit('/', 1)[-1]
+
+    result['seconds'] = default_timer() - start
+    result['process'] = os.getpid()
+    result['writes'] = dict((name, _writes[name] - writes[name])
+        for name in _writes)
+    result['state_sizes'] = list(_state_sizes)
+
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=1000,
+        help='number of simulated users')
+    parser.add_argument('--processes', type=int,
+        default=multiprocessing.cpu_count(), help='size of the process pool')
+    parser.add_argument('--length', type=int, default=10,
+        help='number of steps of the wizard')
+    parser.add_argument('--form-size', type=int, default=5,
+        help='number of fields of each form')
+    parser.add_argument('--back', type=float, default=0.1,
+        help='chance of going back to an earlier step before each step')
+    parser.add_argument('--cancel', type=float, default=0.02,
+        help='chance of cancelling the wizard before each step')
+    parser.add_argument('--session-engine', default='db',
+        choices=sorted(common.SESSION_ENGINES))
+    parser.add_argument('--state-store', default='session',
+        choices=sorted(STATE_STORES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file the JSON results go to, '
+        'standard output by default')
+    options = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix='merlin-load-')
+
+    try:
+        common.setup(database=os.path.join(directory, 'load.db'),
+            SESSION_ENGINE=common.SESSION_ENGINES[options.session_engine],
+            SESSION_FILE_PATH=directory,
+            MERLIN_STATE_STORE='benchmarks.load.CountingStateStore',
+            BENCHMARK_STATE_STORE=STATE_STORES[options.state_store],
+            MERLIN_METRICS_SINK='benchmarks.load.StateSizeSink')
+
+        from django.db import connection
+        from benchmarks import load
+
+        connection.close()
+
+        user_options = {
+            'length': options.length,
+            'form_size': options.form_size,
+            'back': options.back,
+            'cancel': options.cancel,
+            'seed': options.seed,
+        }
+        pool = multiprocessing.Pool(options.processes, load._init_worker)
+        start = default_timer()
+
+        try:
+            users = pool.map(load.simulate_user, [(index, user_options)
+                for index in range(options.users)], chunksize=10)
+
+        finally:
+            pool.close()
+            pool.join()
+
+        elapsed = default_timer() - start
+
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    requests = sum(len(user['GET']) + len(user['POST']) for user in users)
+    errors = sum(user['errors'] for user in users)
+    saves = sum(user['writes']['save'] for user in users)
+    sizes = sum((user['state_sizes'] for user in users), [])
+    processes = {}
+
+    for user in users:
+        processes[user['process']] = processes.get(user['process'], 0) + \
+            len(user['GET']) + len(user['POST'])
+
+    results = {
+        'environment': common.environment(),
+        'options': vars(options),
+        'users': options.users,
+        'seconds': elapsed,
+        'requests': requests,
+        'requests_per_second': requests / elapsed,
+        'errors': errors,
+        'error_rate': float(errors) / requests if requests else 0.0,
+        'outcomes': dict((outcome, len([user for user in users
+            if user['outcome'] == outcome]))
+            for outcome in ('done', 'cancelled', 'failed')),
+        'state_store_writes': {
+            'save': saves,
+            'delete': sum(user['writes']['delete'] for user in users),
+            'saves_per_request': float(saves) / requests if requests else 0.0,
+        },
+        'state_size': {
+            'count': len(sizes),
+            'p50': common.percentile(sizes, 50) if sizes else None,
+            'p99': common.percentile(sizes, 99) if sizes else None,
+            'max': max(sizes) if sizes else None,
+        },
+        'requests_per_process': sorted(processes.values()),
+        'GET': common.summarize(sum((user['GET'] for user in users), [])),
+        'POST': common.summarize(sum((user['POST'] for user in users), [])),
+        'user_seconds': common.summarize([user['seconds'] for user in users]),
+    }
+
+    sys.stderr.write('%d users, %d requests in %.1fs: %.1f req/s, %.2f%% '
+        'errors, %d state writes\n' % (options.users, requests, elapsed,
+        results['requests_per_second'], 100 * results['error_rate'], saves))
+
+    output = json.dumps(results, indent=2, separators=(',', ': '),
+        sort_keys=True)
+
+    if options.output:
+        with open(options.output, 'w') as stream:
+            stream.write(output)
+
+    else:
+        sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Measures the memory used by the wizard state of every active wizard session
+once it is loaded from the state store, and its stored size.
+
+Run it from the root of the repository::
+
+    python -m benchmarks.memory --sessions 1000 --length 20 --output mem.json
+
+The states are built like the generated wizards of the other benchmarks
+would build them, with half of the steps filled in, pickled the way the
+state stores keep them and loaded back all at once. The memory is measured
+with ``tracemalloc`` when the interpreter has it; otherwise the objects
+reachable from the loaded states are walked and their ``sys.getsizeof``
+added up, counting shared objects like interned steps once.
+"""
+import argparse
+import cPickle as pickle
+import gc
+import json
+import sys
+
+from benchmarks import common
+
+
+def _deep_size(roots):
+    seen = set()
+    stack = list(roots)
+    size = 0
+
+    while stack:
+        value = stack.pop()
+
+        if id(value) in seen or isinstance(value, type):
+            continue
+
+        seen.add(id(value))
+        size += sys.getsizeof(value)
+
+        if isinstance(value, dict):
+            stack.extend(value.keys())
+            stack.extend(value.values())
+
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            stack.extend(value)
+
+        for name in getattr(type(value), '__slots__', ()):
+            if name != '__weakref__' and hasattr(value, name):
+                stack.append(getattr(value, name))
+
+        if hasattr(value, '__dict__') and not isinstance(value, type):
+            stack.append(value.__dict__)
+
+    return size
+
+
+def build_states(sessions, length, size):
+    """
+    Returns the pickled states of ``sessions`` wizards of ``length`` steps
+    with ``size`` fields, half of the steps filled in.
+    """
+    from benchmarks.wizards import get_wizard, get_form_data
+    from merlin.wizards.utils import WizardState
+
+    steps = get_wizard(length, size, False).base_steps
+    pickles = []
+
+    for index in range(sessions):
+        state = WizardState(steps=steps[:], current_step=steps[0],
+            form_data={})
+
+        for step in steps[:length // 2]:
+            data = dict((key, '%s %d' % (value, index))
+                for key, value in get_form_data(size).items())
+            state.set_cleaned_data(step.slug, data)
+
+        pickles.append(pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
+
+    return pickles
+
+
+def measure(pickles):
+    """
+    Loads the pickled states and returns the bytes they take in memory, and
+    the name of the method used to measure it.
+    """
+    gc.collect()
+
+    try:
+        import tracemalloc
+
+    except ImportError:
+        states = [pickle.loads(content) for content in pickles]
+
+        return _deep_size(states), 'getsizeof', states
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    states = [pickle.loads(content) for content in pickles]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    used = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+
+    return used, 'tracemalloc', states
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sessions', type=int, default=1000,
+        help='number of active wizard sessions')
+    parser.add_argument('--length', type=int, default=20,
+        help='number of steps of the wizard')
+    parser.add_argument('--form-size', type=int, default=5,
+        help='number of fields of each form')
+    parser.add_argument('--output', help='file the JSON results go to, '
+        'standard output by default')
+    options = parser.parse_args(argv)
+
+    common.setup()
+
+    pickles = build_states(options.sessions, options.length,
+        options.form_size)
+    used, method, states = measure(pickles)
+    stored = sum(len(content) for content in pickles)
+    steps = set(id(step) for state in states for step in state.steps)
+
+    results = {
+        'environment': common.environment(),
+        'options': vars(options),
+        'method': method,
+        'bytes_per_session': float(used) / options.sessions,
+        'stored_bytes_per_session': float(stored) / options.sessions,
+        'distinct_step_objects': len(steps),
+    }
+
+    sys.stderr.write('%d sessions: %.0f bytes in memory and %.0f bytes '
+        'stored per session (%s), %d step objects\n' % (options.sessions,
+        results['bytes_per_session'], results['stored_bytes_per_session'],
+        method, len(steps)))
+
+    output = json.dumps(results, indent=2, separators=(',', ': '),
+        sort_keys=True)
+
+    if options.output:
+        with open(options.output, 'w') as stream:
+            stream.write(output)
+
+    else:
+        sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
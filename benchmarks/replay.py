@@ -0,0 +1,261 @@
+"""
+Replays the wizard requests recorded with the ``MERLIN_RECORD_FILE`` setting
+against generated wizards shaped like the recorded ones, to try a change on
+the traffic of real users.
+
+Run it from the root of the repository::
+
+    python -m benchmarks.replay requests.log --processes 4 --output replay.json
+
+Every recorded wizard is replaced with a generated one with the same steps,
+whose forms have the recorded fields and fail validation where the recorded
+request did. The posted values are made of the recorded lengths. The
+requests of each recorded session are sent in their recorded order by a pool
+of processes sharing one SQLite database file, and the recorded and replayed
+latency of every step are reported as JSON.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+from timeit import default_timer
+
+from benchmarks import common
+from benchmarks.load import STATE_STORES
+
+
+# The slugs that do not name a step.
+RESERVED_SLUGS = ('cancel', 'validate',)
+
+# Recorded fields that are not sent again, like the state kept in the page
+# by the SignedCookieStateStore, which would not verify.
+SKIPPED_FIELDS = ('merlin_state',)
+
+
+def load_recording(path):
+    """
+    Reads a recording and returns the plan of the wizards to generate, as
+    expected by ``benchmarks.wizards.set_replay_plan``, and the recorded
+    requests grouped by session, in their recorded order.
+    """
+    wizards = {}
+    order = []
+    sessions = {}
+
+    with open(path) as stream:
+        for line in stream:
+            if not line.strip():
+                continue
+
+            entry = json.loads(line)
+            sessions.setdefault(entry['session'], []).append(entry)
+
+            if entry['wizard'] not in wizards:
+                wizards[entry['wizard']] = {}
+                order.append(entry['wizard'])
+
+            slug = entry['slug']
+            fields = entry['fields']
+
+            if slug == 'validate':
+                # The step and the fields it checks are named in the request.
+                slug = fields.get('step', None)
+                names = fields.get('field', [])
+                fields = isinstance(names, list) and names or [names]
+
+            elif slug in RESERVED_SLUGS or entry['method'] != 'POST':
+                fields = ()
+
+            if slug and slug not in RESERVED_SLUGS:
+                steps = wizards[entry['wizard']]
+
+                if slug not in steps:
+                    steps[slug] = (len(steps), set())
+
+                steps[slug][1].update(name for name in fields
+                    if name not in SKIPPED_FIELDS)
+
+    plan = []
+
+    for wizard_id in order:
+        steps = sorted(wizards[wizard_id].items(),
+            key=lambda item: item[1][0])
+        plan.append((wizard_id, [(slug, sorted(fields))
+            for slug, (index, fields) in steps]))
+
+    sessions = sorted(sessions.values(), key=lambda entries: entries[0]['at'])
+
+    return plan, sessions
+
+
+def get_data(entry):
+    """
+    Returns the data to send again for a recorded request.
+    """
+    from benchmarks.wizards import INVALID_PARAMETER
+
+    data = {}
+
+    for name, shape in entry['fields'].items():
+        if name in SKIPPED_FIELDS:
+            continue
+
+        if isinstance(shape, int):
+            data[name] = 'x' * shape
+
+        elif isinstance(shape, list) and shape and \
+                isinstance(shape[0], int):
+            data[name] = ['x' * length for length in shape]
+
+        else:
+            # The kept values of the validate parameters.
+            data[name] = shape
+
+    if entry.get('invalid', False):
+        data[INVALID_PARAMETER] = '1'
+
+    return data
+
+
+def _init_worker(plan):
+    from django.db import connection
+    from benchmarks.wizards import set_replay_plan
+
+    # Every process opens its own connection to the database file.
+    connection.close()
+    set_replay_plan(plan)
+
+
+def replay_session(args):
+    """
+    Sends the requests of one recorded session again and returns, for each
+    of them, the wizard id, the slug, the method, the recorded and replayed
+    durations in seconds, whether it failed and whether the status differs
+    from the recorded one.
+    """
+    from django.test.client import Client
+
+    entries, indexes = args
+    client = Client()
+    results = []
+
+    for entry in entries:
+        url = '/replay/%d/%s' % (indexes[entry['wizard']], entry['slug'])
+        data = get_data(entry)
+        start = default_timer()
+
+        try:
+            if entry['method'] == 'POST':
+                response = client.post(url, data)
+
+            else:
+                response = client.get(url, data)
+
+        except Exception:
+            status = None
+
+        else:
+            status = response.status_code
+
+        results.append((entry['wizard'], entry['slug'], entry['method'],
+            entry['ms'] / 1000.0, default_timer() - start,
+            status is None or status >= 500, status != entry['status']))
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('recording', help='file written by the recorder')
+    parser.add_argument('--processes', type=int,
+        default=multiprocessing.cpu_count(), help='size of the process pool')
+    parser.add_argument('--session-engine', default='db',
+        choices=sorted(common.SESSION_ENGINES))
+    parser.add_argument('--state-store', default='session',
+        choices=sorted(STATE_STORES))
+    parser.add_argument('--output', help='file the JSON results go to, '
+        'standard output by default')
+    options = parser.parse_args(argv)
+
+    plan, sessions = load_recording(options.recording)
+    indexes = dict((wizard_id, index)
+        for index, (wizard_id, steps) in enumerate(plan))
+    directory = tempfile.mkdtemp(prefix='merlin-replay-')
+
+    try:
+        common.setup(database=os.path.join(directory, 'replay.db'),
+            SESSION_ENGINE=common.SESSION_ENGINES[options.session_engine],
+            SESSION_FILE_PATH=directory,
+            MERLIN_STATE_STORE=STATE_STORES[options.state_store])
+
+        from django.db import connection
+        from benchmarks import replay
+
+        connection.close()
+
+        pool = multiprocessing.Pool(options.processes, replay._init_worker,
+            (plan,))
+        start = default_timer()
+
+        try:
+            results = sum(pool.map(replay.replay_session,
+                [(entries, indexes) for entries in sessions], chunksize=10),
+                [])
+
+        finally:
+            pool.close()
+            pool.join()
+
+        elapsed = default_timer() - start
+
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    steps = {}
+
+    for wizard_id, slug, method, recorded, replayed, error, changed in \
+            results:
+        durations = steps.setdefault('%s %s %s' % (wizard_id, slug, method),
+            ([], []))
+        durations[0].append(recorded)
+        durations[1].append(replayed)
+
+    errors = len([result for result in results if result[5]])
+    output = {
+        'environment': common.environment(),
+        'options': vars(options),
+        'sessions': len(sessions),
+        'requests': len(results),
+        'seconds': elapsed,
+        'requests_per_second': len(results) / elapsed if elapsed else 0.0,
+        'errors': errors,
+        'status_changes': len([result for result in results if result[6]]),
+        'recorded': common.summarize([result[3] for result in results]),
+        'replayed': common.summarize([result[4] for result in results]),
+        'steps': dict((key, {
+            'recorded': common.summarize(recorded),
+            'replayed': common.summarize(replayed),
+        }) for key, (recorded, replayed) in steps.items()),
+    }
+
+    sys.stderr.write('%d sessions, %d requests in %.1fs: %.1f req/s, %d '
+        'errors, replayed p99 %.1fms\n' % (len(sessions), len(results),
+        elapsed, output['requests_per_second'], errors,
+        output['replayed'].get('p99', 0.0)))
+
+    output = json.dumps(output, indent=2, separators=(',', ': '),
+        sort_keys=True)
+
+    if options.output:
+        with open(options.output, 'w') as stream:
+            stream.write(output)
+
+    else:
+        sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
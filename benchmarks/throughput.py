@@ -0,0 +1,143 @@
+"""
+Measures the throughput and the latency of the wizards of the test project
+and of generated wizards, in process with the Django test client.
+
+Run it from the root of the repository::
+
+    python -m benchmarks.throughput --lengths 2,10,50,200 --form-sizes 3,30 \\
+        --mutations 0,1 --session-engines db,cache --output results.json
+
+Every combination of the options is measured. The results, with the
+requests per second and the p50 and p99 latency of every step for GET and
+POST, are written as JSON so two runs can be compared with
+``python -m benchmarks.compare``.
+"""
+import argparse
+import itertools
+import json
+import sys
+from timeit import default_timer
+
+from benchmarks import common
+
+
+def measure(name, url_base, slug, get_data, iterations):
+    """
+    Walks a wizard ``iterations`` times, each time with a new client, after
+    one walk to warm up, and returns the timings.
+    """
+    from django.test.client import Client
+
+    timings = {'GET': [], 'POST': []}
+    steps = {}
+    errors = [0]
+
+    def record(method, slug, duration, response):
+        if response.status_code >= 400:
+            errors[0] += 1
+
+        timings[method].append(duration)
+        steps.setdefault(slug, {'GET': [], 'POST': []})[method].append(
+            duration)
+
+    common.run_flow(Client(), url_base, slug, get_data,
+        lambda *args: None)
+
+    start = default_timer()
+
+    for iteration in range(iterations):
+        response = common.run_flow(Client(), url_base, slug, get_data, record)
+
+        if response.status_code != 200:
+            raise RuntimeError('%s did not finish: %d %s' % (name,
+                response.status_code, response.content[:200]))
+
+    elapsed = default_timer() - start
+    requests = len(timings['GET']) + len(timings['POST'])
+
+    return {
+        'requests': requests,
+        'errors': errors[0],
+        'seconds': elapsed,
+        'requests_per_second': requests / elapsed,
+        'GET': common.summarize(timings['GET']),
+        'POST': common.summarize(timings['POST']),
+        'steps': dict((slug, {
+            'GET': common.summarize(durations['GET']),
+            'POST': common.summarize(durations['POST'])})
+            for slug, durations in steps.items()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scenarios', default='project,generated',
+        help='project (the bettertest wizard) and/or generated wizards')
+    parser.add_argument('--lengths', default='2,10,50,200',
+        help='number of steps of the generated wizards')
+    parser.add_argument('--form-sizes', default='3,30',
+        help='number of fields of each generated form')
+    parser.add_argument('--mutations', default='0,1',
+        help='1 to insert and remove steps on every POST, 0 not to')
+    parser.add_argument('--session-engines', default='db,cache',
+        help='any of %s' % ', '.join(sorted(common.SESSION_ENGINES)))
+    parser.add_argument('--iterations', type=int, default=5,
+        help='number of times each wizard is walked through')
+    parser.add_argument('--output', help='file the JSON results go to, '
+        'standard output by default')
+    options = parser.parse_args(argv)
+
+    common.setup()
+
+    from benchmarks.wizards import get_form_data
+
+    scenarios = common.parse_list(options.scenarios)
+    results = []
+
+    for engine in common.parse_list(options.session_engines):
+        common.use_session_engine(engine)
+        configs = []
+
+        if 'project' in scenarios:
+            configs.append(({'wizard': 'bettertest'}, '/bettertest/',
+                'user-details', common.PROJECT_DATA.get))
+
+        if 'generated' in scenarios:
+            for length, size, mutate in itertools.product(
+                    common.parse_list(options.lengths, int),
+                    common.parse_list(options.form_sizes, int),
+                    common.parse_list(options.mutations, int)):
+                data = get_form_data(size)
+                configs.append(({'wizard': 'generated', 'length': length,
+                    'form_size': size, 'mutate': bool(mutate)},
+                    '/benchmark/%d/%d/%d/' % (length, size, mutate),
+                    'step-0', lambda slug, data=data: data))
+
+        for params, url_base, slug, get_data in configs:
+            params['session_engine'] = engine
+            result = measure(params['wizard'], url_base, slug, get_data,
+                options.iterations)
+            result['params'] = params
+            results.append(result)
+
+            sys.stderr.write('%-72s %8.1f req/s  GET p50 %6.2fms p99 %6.2fms'
+                '  POST p50 %6.2fms p99 %6.2fms\n' % (
+                ' '.join('%s=%s' % item for item in sorted(params.items())),
+                result['requests_per_second'], result['GET']['p50'],
+                result['GET']['p99'], result['POST']['p50'],
+                result['POST']['p99']))
+
+    output = json.dumps({'environment': common.environment(),
+        'iterations': options.iterations, 'results': results}, indent=2,
+        separators=(',', ': '), sort_keys=True)
+
+    if options.output:
+        with open(options.output, 'w') as stream:
+            stream.write(output)
+
+    else:
+        sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+from django.conf.urls.defaults import *
+
+from merlin.tests.fixtures.testproject.urls import urlpatterns as project
+
+
+urlpatterns = project + patterns('',
+    url(r'^benchmark/(?P<length>\d+)/(?P<size>\d+)/(?P<mutate>[01])/'
+        r'(?P<slug>[A-Za-z0-9_-]+)$', 'benchmarks.wizards.benchmark_wizard'),
+    url(r'^replay/(?P<index>\d+)/(?P<slug>[A-Za-z0-9_-]+)$',
+        'benchmarks.wizards.replay_wizard'),
+)
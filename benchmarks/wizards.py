@@ -0,0 +1,147 @@
+"""
+Generated wizards used by the benchmarks, with any number of steps, any
+number of fields per form and optional step list mutation, and the wizards
+standing in for recorded ones when requests are replayed.
+"""
+from django import forms
+from django.http import HttpResponse
+
+from merlin.wizards.session import SessionWizard
+from merlin.wizards.utils import Step
+
+
+_wizards = {}
+_replay_wizards = []
+
+# Posted along with the data of the requests that were recorded as invalid.
+INVALID_PARAMETER = '_replay_invalid'
+
+
+def get_form(size):
+    """
+    Returns a form class with ``size`` required ``CharField`` fields.
+    """
+    name = 'BenchmarkForm%d' % size
+
+    if name not in globals():
+        # The steps pickle their form class by name, so it is published as
+        # an attribute of this module.
+        attrs = dict(('field_%d' % index, forms.CharField())
+            for index in range(size))
+        attrs['__module__'] = __name__
+        globals()[name] = type(name, (forms.Form,), attrs)
+
+    return globals()[name]
+
+
+def get_form_data(size):
+    """
+    Returns valid data for the form returned by :func:`get_form`.
+    """
+    return dict(('field_%d' % index, 'Value of field %d' % index)
+        for index in range(size))
+
+
+class BenchmarkWizard(SessionWizard):
+    """
+    When ``mutate`` is set every generated step inserts an extra step after
+    itself and removes the generated step that followed it, so the wizard
+    keeps its length while the step list changes on every POST.
+    """
+    def __init__(self, steps, mutate=False, **kwargs):
+        super(BenchmarkWizard, self).__init__(steps, **kwargs)
+        self.mutate = mutate
+
+    def process_step(self, request, current_step, form):
+        if not self.mutate or current_step.slug.startswith('extra-'):
+            return
+
+        if self.get_step(request, 'extra-%s' % current_step.slug):
+            # The step was posted again after going back to it.
+            return
+
+        following = self.get_after(request, current_step)
+        self.insert_after(request, current_step,
+            Step('extra-%s' % current_step.slug, current_step.form))
+
+        if following is not None:
+            self.remove_step(request, following)
+
+    def done(self, request):
+        self.get_form_data(request)
+        self.clear(request)
+
+        return HttpResponse('done', mimetype='text/plain')
+
+
+def get_wizard(length, size, mutate):
+    """
+    Returns the wizard with ``length`` steps of ``size`` fields, creating it
+    the first time it is asked for.
+    """
+    key = (length, size, mutate)
+
+    if key not in _wizards:
+        form = get_form(size)
+        steps = [Step('step-%d' % index, form) for index in range(length)]
+        _wizards[key] = BenchmarkWizard(steps, mutate=mutate,
+            namespace='benchmark-%d-%d-%d' % key)
+
+    return _wizards[key]
+
+
+def benchmark_wizard(request, length, size, mutate, slug):
+    """
+    View mounting the generated wizards under
+    ``/benchmark/<length>/<size>/<mutate>/<slug>``.
+    """
+    wizard = get_wizard(int(length), int(size), mutate == '1')
+
+    return wizard(request, slug=slug)
+
+
+def _clean_replayed(form):
+    if form.data.get(INVALID_PARAMETER, None):
+        raise forms.ValidationError('The recorded request was invalid.')
+
+    return form.cleaned_data
+
+
+def get_replay_form(wizard_index, step_index, fields):
+    """
+    Returns a form class with an optional ``CharField`` for each of
+    ``fields``, which fails validation when :data:`INVALID_PARAMETER` is
+    posted.
+    """
+    name = 'ReplayForm%d_%d' % (wizard_index, step_index)
+
+    if name not in globals():
+        attrs = dict((field, forms.CharField(required=False))
+            for field in fields)
+        attrs['clean'] = _clean_replayed
+        attrs['__module__'] = __name__
+        globals()[name] = type(name, (forms.Form,), attrs)
+
+    return globals()[name]
+
+
+def set_replay_plan(plan):
+    """
+    Creates the wizards standing in for the recorded ones. ``plan`` is a
+    list of ``(wizard_id, steps)`` pairs, where ``steps`` is a list of
+    ``(slug, fields)`` pairs.
+    """
+    del _replay_wizards[:]
+
+    for wizard_index, (wizard_id, steps) in enumerate(plan):
+        _replay_wizards.append(BenchmarkWizard([Step(slug,
+            get_replay_form(wizard_index, step_index, fields))
+            for step_index, (slug, fields) in enumerate(steps)],
+            namespace='replay-%d' % wizard_index))
+
+
+def replay_wizard(request, index, slug):
+    """
+    View mounting the replay wizards under ``/replay/<index>/<slug>``.
+    """
+    return _replay_wizards[int(index)](request, slug=slug)
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.importlib import import_module
+
+from merlin.models import FunnelCount
+from merlin.wizards.analytics import EVENTS
+
+
+class Command(BaseCommand):
+    args = '[wizard_id wizard_id ...]'
+    help = ("Prints the funnel of the wizards, from the counts kept by the "
+        "DatabaseAnalyticsSink.")
+
+    def handle(self, *wizard_ids, **options):
+        counts = {}
+        queryset = FunnelCount.objects.all()
+
+        if wizard_ids:
+            queryset = queryset.filter(wizard_id__in=wizard_ids)
+
+        for count in queryset:
+            steps = counts.setdefault(count.wizard_id, {})
+            steps.setdefault(count.slug, dict.fromkeys(EVENTS, 0))
+            steps[count.slug][count.event] = count.count
+
+        for wizard_id in sorted(counts):
+            self.stdout.write('%s\n' % wizard_id)
+            self.stdout.write('  %-30s %s %10s\n' % ('step',
+                ' '.join(['%8s' % event for event in EVENTS]), 'completed'))
+
+            for slug in self._order(wizard_id, counts[wizard_id]):
+                events = counts[wizard_id][slug]
+                views = events['view'] - events['back']
+
+                if views > 0:
+                    completed = '%.1f%%' % (100.0 * events['valid'] / views)
+
+                else:
+                    completed = '-'
+
+                self.stdout.write('  %-30s %s %10s\n' % (slug,
+                    ' '.join(['%8d' % events[event] for event in EVENTS]),
+                    completed))
+
+            self.stdout.write('\n')
+
+    def _order(self, wizard_id, steps):
+        """
+        Returns the slugs in the order of the steps of the wizard, when the
+        wizard is mounted in the urlconf, followed by the other slugs.
+        """
+        import_module(settings.ROOT_URLCONF)
+
+        from merlin.wizards.session import _wizards
+
+        wizard = _wizards.get(wizard_id, None)
+        order = []
+
+        if wizard is not None:
+            order = [step.slug for step in wizard.base_steps
+                if step.slug in steps]
+
+        return order + sorted(set(steps) - set(order))
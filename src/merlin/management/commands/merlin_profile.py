@@ -0,0 +1,59 @@
+import os
+import pstats
+from collections import defaultdict
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from merlin.wizards.profiling import get_profile_dir
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('--dir', dest='directory', default=None,
+            help='Directory of the profiles, MERLIN_PROFILE_DIR by default.'),
+        make_option('--sort', dest='sort', default='cumulative',
+            help='Order of the functions, as accepted by pstats.'),
+        make_option('--limit', dest='limit', type='int', default=20,
+            help='Number of functions printed for each step.'),
+        make_option('--combine', dest='combine', action='store_true',
+            default=False, help='Merge the profiles of all the steps.'),
+    )
+    args = '[filter filter ...]'
+    help = ("Merges the profiles of the wizard requests dumped by every "
+        "process and prints the hottest functions of each wizard, step and "
+        "method. Only the profiles whose name contains one of the filters "
+        "are used, when filters are given.")
+
+    def handle(self, *filters, **options):
+        directory = options['directory'] or get_profile_dir()
+
+        if not os.path.isdir(directory):
+            raise CommandError("No profiles found in %s." % directory)
+
+        profiles = defaultdict(list)
+
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith('.prof'):
+                continue
+
+            # Strips the process id and the extension.
+            name = filename.rsplit('.', 2)[0]
+
+            if filters and not [part for part in filters if part in name]:
+                continue
+
+            if options['combine']:
+                name = 'all'
+
+            profiles[name].append(os.path.join(directory, filename))
+
+        if not profiles:
+            raise CommandError("No profiles found in %s." % directory)
+
+        for name in sorted(profiles):
+            self.stdout.write('%s\n' % name.replace('--', ' '))
+
+            stats = pstats.Stats(*profiles[name], stream=self.stdout)
+            stats.sort_stats(options['sort'])
+            stats.print_stats(options['limit'])
@@ -0,0 +1,34 @@
+from django.core.management.base import NoArgsCommand
+from django.core.urlresolvers import get_resolver
+
+from merlin.wizards.session import SessionWizard, _wizards
+
+
+class Command(NoArgsCommand):
+    help = ("Imports the urlconf and compiles every wizard it mounts, so the "
+        "first requests after a deploy do not pay for it.")
+
+    def handle_noargs(self, **options):
+        wizards = {}
+
+        for wizard in self._find_wizards(get_resolver(None).url_patterns):
+            wizards[wizard.id] = wizard
+
+        # Wizards created by the urlconf modules but mounted through a view.
+        for wizard in _wizards.values():
+            wizards.setdefault(wizard.id, wizard)
+
+        for wizard_id in sorted(wizards):
+            wizards[wizard_id].compile()
+
+            if int(options.get('verbosity', 1)) > 0:
+                self.stdout.write('Compiled %s\n' % wizard_id)
+
+    def _find_wizards(self, patterns):
+        for pattern in patterns:
+            if hasattr(pattern, 'url_patterns'):
+                for wizard in self._find_wizards(pattern.url_patterns):
+                    yield wizard
+
+            elif isinstance(pattern.callback, SessionWizard):
+                yield pattern.callback
@@ -0,0 +1,58 @@
+from django.db import models
+
+
+class WizardEvent(models.Model):
+    """
+    The changes made to the state of a wizard by one save, as recorded by the
+    :class:`~merlin.wizards.stores.EventLogStateStore`.
+    """
+    session_key = models.CharField(max_length=40)
+    wizard_id = models.CharField(max_length=255)
+    sequence = models.PositiveIntegerField()
+    names = models.CharField(max_length=255)
+    data = models.TextField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('sequence',)
+        unique_together = (('session_key', 'wizard_id', 'sequence',),)
+
+    def __unicode__(self):
+        return u'%s #%d %s' % (self.wizard_id, self.sequence, self.names)
+
+
+class WizardSnapshot(models.Model):
+    """
+    The complete state of a wizard after the event with the same sequence
+    number, used as the starting point to replay the events that follow it.
+    """
+    session_key = models.CharField(max_length=40)
+    wizard_id = models.CharField(max_length=255)
+    sequence = models.PositiveIntegerField()
+    data = models.TextField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('sequence',)
+        unique_together = (('session_key', 'wizard_id', 'sequence',),)
+
+    def __unicode__(self):
+        return u'%s #%d' % (self.wizard_id, self.sequence)
+
+
+class FunnelCount(models.Model):
+    """
+    How many times an event of the funnel happened on a step of a wizard, as
+    kept by the :class:`~merlin.wizards.analytics.DatabaseAnalyticsSink`.
+    """
+    wizard_id = models.CharField(max_length=255)
+    slug = models.CharField(max_length=255)
+    event = models.CharField(max_length=20)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = (('wizard_id', 'slug', 'event',),)
+
+    def __unicode__(self):
+        return u'%s %s %s: %d' % (self.wizard_id, self.slug, self.event,
+            self.count)
@@ -22,3 +22,8 @@ class FewMoreThingsForm(forms.Form):
 class SocialForm(forms.Form):
     twitter = forms.URLField()
     facebook = forms.URLField()
+
+
+class DocumentForm(forms.Form):
+    title = forms.CharField()
+    document = forms.FileField()
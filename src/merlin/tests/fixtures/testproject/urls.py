@@ -1,6 +1,7 @@
 from django.conf.urls.defaults import *
 
-from merlin.tests.fixtures.testproject.wizard import MockWizard
+from merlin.tests.fixtures.testproject.wizard import MockWizard, UploadWizard
+from merlin.wizards.stores import CacheStateStore, SignedCookieStateStore
 from merlin.wizards.utils import Step
 from merlin.wizards.session import SessionWizard
 
@@ -10,13 +11,31 @@ from merlin.tests.fixtures.testproject import views
 urlpatterns = patterns('',
     url(r'^simpletest$', SessionWizard([
         Step('user-details', forms.UserDetailsForm),
-        Step('contact-details', forms.ContactDetailsForm)])),
+        Step('contact-details', forms.ContactDetailsForm)],
+        namespace='simpletest-index')),
     url(r'^simpletest/(?P<slug>[A-Za-z0-9_-]+)$', SessionWizard([
         Step('user-details', forms.UserDetailsForm),
-        Step('contact-details', forms.ContactDetailsForm)])),
+        Step('contact-details', forms.ContactDetailsForm)],
+        namespace='simpletest')),
+    url(r'^navtest/user-details/(?P<slug>[A-Za-z0-9_-]+)/form$',
+        SessionWizard([
+            Step('user-details', forms.UserDetailsForm),
+            Step('contact-details', forms.ContactDetailsForm)],
+            namespace='navtest'), name='navtest'),
     url(r'^bettertest/(?P<slug>[A-Za-z0-9_-]+)$', MockWizard([
         Step('user-details', forms.UserDetailsForm),
         Step('contact-details', forms.ContactDetailsForm)])),
+    url(r'^cachetest/(?P<slug>[A-Za-z0-9_-]+)$', MockWizard([
+        Step('user-details', forms.UserDetailsForm),
+        Step('contact-details', forms.ContactDetailsForm)],
+        store=CacheStateStore(), namespace='cachetest')),
+    url(r'^statelesstest/(?P<slug>[A-Za-z0-9_-]+)$', MockWizard([
+        Step('user-details', forms.UserDetailsForm),
+        Step('contact-details', forms.ContactDetailsForm)],
+        store=SignedCookieStateStore(), namespace='statelesstest')),
+    url(r'^uploadtest/(?P<slug>[A-Za-z0-9_-]+)$', UploadWizard([
+        Step('document', forms.DocumentForm),
+        Step('user-details', forms.UserDetailsForm)])),
     url(r'^$', views.index, name='test-index'),
     url(r'^more$', views.more, name='test-more'),
 )
@@ -45,3 +45,15 @@ class MockWizard(SessionWizard):
         if step.slug == 'social-info':
             return {
                 'global_id': self._get_state(request).global_id}
+
+
+class UploadWizard(SessionWizard):
+    def done(self, request):
+        form_data = self.get_form_data(request)
+        document = form_data['document']['document']
+        content = document.read()
+        document.close()
+
+        self.clear(request)
+
+        return HttpResponse(content, mimetype="text/plain")
@@ -0,0 +1,138 @@
+from StringIO import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase
+
+from merlin.models import FunnelCount
+from merlin.wizards import analytics
+
+
+class RecordingSink(analytics.BaseAnalyticsSink):
+    flushes = []
+
+    def flush(self, counts):
+        self.flushes.append(counts)
+
+
+class FailingSink(RecordingSink):
+    failures = 0
+
+    def flush(self, counts):
+        if FailingSink.failures:
+            FailingSink.failures -= 1
+            raise ValueError("Sink unavailable.")
+
+        super(FailingSink, self).flush(counts)
+
+
+class AnalyticsTestCase(TestCase):
+    data = {
+        'first_name': 'Chad',
+        'last_name': 'Gallemore',
+        'email': 'cgallemore@gmail.com'
+    }
+
+    def setUp(self):
+        settings.MERLIN_ANALYTICS_SINK = \
+            'merlin.tests.test_analytics.RecordingSink'
+        settings.MERLIN_ANALYTICS_FLUSH_INTERVAL = 3600
+        RecordingSink.flushes = []
+        analytics.flush()
+        RecordingSink.flushes = []
+
+    def tearDown(self):
+        del settings.MERLIN_ANALYTICS_SINK
+        del settings.MERLIN_ANALYTICS_FLUSH_INTERVAL
+
+    def _walk(self):
+        self.client.get('/simpletest/user-details')
+        self.client.post('/simpletest/user-details', {})
+        self.client.post('/simpletest/user-details', self.data)
+        self.client.get('/simpletest/user-details')
+        self.client.get('/simpletest/cancel')
+
+    def test_events_are_counted_and_flushed_in_bulk(self):
+        self._walk()
+
+        self.assertEquals(RecordingSink.flushes, [])
+
+        analytics.flush()
+
+        wizard_id = 'merlin.wizards.session.SessionWizard:simpletest'
+
+        self.assertEquals(RecordingSink.flushes, [{
+            (wizard_id, 'user-details', 'view'): 2,
+            (wizard_id, 'user-details', 'back'): 1,
+            (wizard_id, 'user-details', 'invalid'): 1,
+            (wizard_id, 'user-details', 'valid'): 1,
+            (wizard_id, 'contact-details', 'cancel'): 1}])
+
+    def test_cancel_counted_for_named_step(self):
+        self.client.get('/simpletest/user-details')
+        self.client.post('/simpletest/user-details', self.data)
+        self.client.get('/simpletest/user-details')
+        self.client.get('/simpletest/cancel', {'step': 'user-details'})
+        analytics.flush()
+
+        wizard_id = 'merlin.wizards.session.SessionWizard:simpletest'
+
+        self.assertEquals(RecordingSink.flushes[0][(wizard_id,
+            'user-details', 'cancel')], 1)
+
+    def test_counts_kept_when_flush_fails(self):
+        settings.MERLIN_ANALYTICS_SINK = \
+            'merlin.tests.test_analytics.FailingSink'
+        FailingSink.failures = 1
+
+        self.client.get('/simpletest/user-details')
+        analytics.flush()
+        self.client.get('/simpletest/user-details')
+        analytics.flush()
+
+        wizard_id = 'merlin.wizards.session.SessionWizard:simpletest'
+
+        self.assertEquals(RecordingSink.flushes, [{
+            (wizard_id, 'user-details', 'view'): 2}])
+
+    def test_flush_interval(self):
+        settings.MERLIN_ANALYTICS_FLUSH_INTERVAL = 0
+
+        self.client.get('/simpletest/user-details')
+
+        self.assertEquals(len(RecordingSink.flushes), 1)
+
+    def test_nothing_counted_without_sink(self):
+        del settings.MERLIN_ANALYTICS_SINK
+
+        self._walk()
+
+        settings.MERLIN_ANALYTICS_SINK = \
+            'merlin.tests.test_analytics.RecordingSink'
+        analytics.flush()
+
+        self.assertEquals(RecordingSink.flushes, [])
+
+    def test_database_sink_and_funnel_command(self):
+        sink = analytics.DatabaseAnalyticsSink()
+        wizard_id = 'merlin.wizards.session.SessionWizard:simpletest'
+        counts = {
+            (wizard_id, 'user-details', 'view'): 4,
+            (wizard_id, 'user-details', 'valid'): 2,
+            (wizard_id, 'contact-details', 'view'): 2,
+        }
+
+        sink.flush(counts)
+        sink.flush(counts)
+
+        self.assertEquals(FunnelCount.objects.get(wizard_id=wizard_id,
+            slug='user-details', event='view').count, 8)
+
+        output = StringIO()
+        call_command('merlin_funnel', wizard_id, stdout=output)
+        lines = output.getvalue().splitlines()
+
+        self.assertEquals(lines[0], wizard_id)
+        self.assertEquals(lines[2].split()[0], 'user-details')
+        self.assertTrue(lines[2].endswith('50.0%'))
+        self.assertEquals(lines[3].split()[0], 'contact-details')
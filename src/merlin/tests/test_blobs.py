@@ -0,0 +1,80 @@
+import unittest
+
+from django.conf import settings
+from django.test import TestCase
+
+from merlin.wizards import MissingBlobException
+from merlin.wizards.blobs import *
+
+
+class BlobsTestCase(unittest.TestCase):
+    def setUp(self):
+        settings.MERLIN_BLOB_THRESHOLD = 100
+
+    def tearDown(self):
+        del settings.MERLIN_BLOB_THRESHOLD
+
+    def test_large_values_are_offloaded(self):
+        data = offload_values({'small': 'x', 'large': 'x' * 200})
+
+        self.assertEquals(data['small'], 'x')
+        self.assertTrue(isinstance(data['large'], BlobReference))
+        self.assertEquals(load_values(data), {'small': 'x', 'large': 'x' * 200})
+
+    def test_nothing_offloaded_without_threshold(self):
+        del settings.MERLIN_BLOB_THRESHOLD
+
+        data = offload_values({'large': 'x' * 200})
+
+        self.assertEquals(data, {'large': 'x' * 200})
+
+        settings.MERLIN_BLOB_THRESHOLD = 100
+
+    def test_replaced_and_deleted_blobs(self):
+        previous = offload_values({'large': 'x' * 200})
+        data = offload_values({'large': 'y' * 200})
+
+        delete_blobs(previous, data)
+
+        self.assertRaises(MissingBlobException, previous['large'].load)
+        self.assertEquals(data['large'].load(), 'y' * 200)
+
+        delete_blobs(data)
+
+        self.assertRaises(MissingBlobException, data['large'].load)
+
+    def test_cache_blob_store(self):
+        store = CacheBlobStore()
+        store.save('test', 'content')
+
+        self.assertEquals(store.load('test'), 'content')
+
+        store.delete('test')
+
+        self.assertRaises(MissingBlobException, store.load, 'test')
+
+
+class BlobWizardTest(TestCase):
+    def setUp(self):
+        settings.MERLIN_BLOB_THRESHOLD = 100
+
+    def tearDown(self):
+        del settings.MERLIN_BLOB_THRESHOLD
+
+    def test_large_values_kept_out_of_session(self):
+        self.client.get('/bettertest/user-details')
+        self.client.post('/bettertest/user-details', {
+            'first_name': 'Chad',
+            'last_name': 'Gallemore',
+            'email': 'cgallemore@gmail.com'
+        })
+        self.client.post('/bettertest/few-more-things', {'bio': 'My bio ' * 50})
+
+        state = self.client.session['merlin.tests.fixtures.testproject.wizard.MockWizard']
+
+        self.assertTrue(isinstance(state.form_data['few-more-things']['bio'],
+            BlobReference))
+
+        response = self.client.get('/bettertest/few-more-things')
+
+        self.assertTrue(('My bio ' * 50).strip() in response.content)
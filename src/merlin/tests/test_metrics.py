@@ -0,0 +1,146 @@
+import logging
+
+from django.conf import settings
+from django.test import TestCase
+
+from merlin.wizards import signals
+from merlin.wizards.metrics import *
+
+
+class RecordingSink(BaseMetricsSink):
+    timings = []
+    gauges = []
+
+    def timing(self, name, duration, tags):
+        self.timings.append((name, tags))
+
+    def gauge(self, name, value, tags):
+        self.gauges.append((name, value, tags))
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        settings.MERLIN_METRICS_SINK = 'merlin.tests.test_metrics.RecordingSink'
+        RecordingSink.timings = []
+        RecordingSink.gauges = []
+
+    def tearDown(self):
+        del settings.MERLIN_METRICS_SINK
+
+    def test_phases_are_timed(self):
+        self.client.get('/simpletest/user-details')
+        self.client.post('/simpletest/user-details', {
+            'first_name': 'Chad',
+            'last_name': 'Gallemore',
+            'email': 'cgallemore@gmail.com'
+        })
+
+        names = [(name, tags['method']) for name, tags in RecordingSink.timings]
+
+        self.assertEquals(names, [
+            ('load', 'GET'), ('initialize', 'GET'), ('render_form', 'GET'),
+            ('save', 'GET'), ('request', 'GET'),
+            ('load', 'POST'), ('initialize', 'POST'), ('is_valid', 'POST'),
+            ('process_step', 'POST'), ('save', 'POST'), ('request', 'POST')])
+
+        for name, tags in RecordingSink.timings:
+            self.assertEquals(tags['wizard'],
+                'merlin.wizards.session.SessionWizard:simpletest')
+            self.assertEquals(tags['step'], 'user-details')
+
+    def test_no_sink(self):
+        del settings.MERLIN_METRICS_SINK
+
+        self.assertEquals(get_metrics_sink(), None)
+        self.assertTrue(timed('load', 'wizard', 'slug', 'GET') is
+            timed('save', 'wizard', 'slug', 'GET'))
+
+        self.client.get('/simpletest/user-details')
+
+        self.assertEquals(RecordingSink.timings, [])
+
+        settings.MERLIN_METRICS_SINK = 'merlin.tests.test_metrics.RecordingSink'
+
+    def test_signal_sink(self):
+        settings.MERLIN_METRICS_SINK = 'merlin.wizards.metrics.SignalMetricsSink'
+        received = []
+
+        def receiver(sender, name, duration, tags, **kwargs):
+            received.append(name)
+
+        signals.timing.connect(receiver)
+
+        try:
+            self.client.get('/simpletest/user-details')
+
+        finally:
+            signals.timing.disconnect(receiver)
+
+        self.assertEquals(received, ['load', 'initialize', 'render_form',
+            'save', 'request'])
+
+
+class StateSizeTestCase(TestCase):
+    data = {
+        'first_name': 'Chad',
+        'last_name': 'Gallemore',
+        'email': 'cgallemore@gmail.com'
+    }
+
+    def setUp(self):
+        settings.MERLIN_METRICS_SINK = 'merlin.tests.test_metrics.RecordingSink'
+        RecordingSink.gauges = []
+
+    def tearDown(self):
+        del settings.MERLIN_METRICS_SINK
+
+    def test_sizes_are_measured(self):
+        self.client.post('/simpletest/user-details', self.data)
+
+        names = [name for name, value, tags in RecordingSink.gauges]
+        sizes = dict((name, value) for name, value, tags
+            in RecordingSink.gauges)
+
+        self.assertEquals(names, ['state_size', 'step_size'])
+        self.assertTrue(sizes['state_size'] > sizes['step_size'] > 0)
+
+    def test_warning_size(self):
+        settings.MERLIN_STATE_SIZE_WARNING = 10
+        handler = RecordingHandler()
+        logging.getLogger('merlin.wizards').addHandler(handler)
+
+        try:
+            post = self.client.post('/simpletest/user-details', self.data)
+
+        finally:
+            logging.getLogger('merlin.wizards').removeHandler(handler)
+            del settings.MERLIN_STATE_SIZE_WARNING
+
+        self.assertEquals(post.status_code, 302)
+        self.assertEquals(len(handler.records), 1)
+        self.assertEquals(handler.records[0].levelname, 'WARNING')
+
+    def test_size_limit(self):
+        settings.MERLIN_STATE_SIZE_LIMIT = 10
+
+        try:
+            post = self.client.post('/simpletest/user-details', self.data)
+
+        finally:
+            del settings.MERLIN_STATE_SIZE_LIMIT
+
+        self.assertEquals(post.status_code, 200)
+        self.assertTrue('This step holds too much data' in post.content)
+
+        post = self.client.post('/simpletest/user-details', self.data)
+
+        self.assertEquals(post.status_code, 302)
@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase
+
+
+class ProfilingTestCase(TestCase):
+    def setUp(self):
+        settings.MERLIN_PROFILE_DIR = tempfile.mkdtemp()
+        settings.MERLIN_PROFILE_RATE = 1
+
+    def tearDown(self):
+        shutil.rmtree(settings.MERLIN_PROFILE_DIR)
+        del settings.MERLIN_PROFILE_DIR
+        del settings.MERLIN_PROFILE_RATE
+
+    def test_requests_are_profiled(self):
+        response = self.client.get('/simpletest/user-details')
+        self.assertEquals(response.status_code, 200)
+
+        self.client.get('/simpletest/user-details')
+
+        self.assertEquals(os.listdir(settings.MERLIN_PROFILE_DIR), [
+            'merlin.wizards.session.SessionWizard:simpletest--user-details'
+            '--GET.%d.prof' % os.getpid()])
+
+        output = StringIO()
+        call_command('merlin_profile', 'simpletest', limit=5, stdout=output)
+
+        self.assertTrue(output.getvalue().startswith(
+            'merlin.wizards.session.SessionWizard:simpletest user-details '
+            'GET\n'))
+        self.assertTrue('_handle' in output.getvalue())
+
+    def test_slug_filter(self):
+        settings.MERLIN_PROFILE_SLUGS = ['contact-details']
+
+        try:
+            self.client.get('/simpletest/user-details')
+
+        finally:
+            del settings.MERLIN_PROFILE_SLUGS
+
+        self.assertEquals(os.listdir(settings.MERLIN_PROFILE_DIR), [])
+
+    def test_disabled(self):
+        settings.MERLIN_PROFILE_RATE = 0
+
+        self.client.get('/simpletest/user-details')
+
+        self.assertEquals(os.listdir(settings.MERLIN_PROFILE_DIR), [])
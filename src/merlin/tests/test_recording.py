@@ -0,0 +1,59 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase
+from django.utils import simplejson
+
+
+class RecordingTest(TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(prefix='merlin-record-')
+        os.close(handle)
+        settings.MERLIN_RECORD_FILE = self.path
+
+    def tearDown(self):
+        del settings.MERLIN_RECORD_FILE
+        os.remove(self.path)
+
+    def _entries(self):
+        with open(self.path) as stream:
+            return [simplejson.loads(line) for line in stream]
+
+    def test_requests_are_recorded(self):
+        self.client.get('/simpletest/user-details')
+        self.client.post('/simpletest/user-details', {'first_name': 'Chad'})
+        self.client.post('/simpletest/user-details', {
+            'first_name': 'Chad',
+            'last_name': 'Gallemore',
+            'email': 'cgallemore@gmail.com'})
+
+        entries = self._entries()
+
+        self.assertEquals([(entry['method'], entry['status'])
+            for entry in entries], [('GET', 200), ('POST', 200),
+            ('POST', 302)])
+        self.assertEquals(entries[0]['wizard'],
+            'merlin.wizards.session.SessionWizard:simpletest')
+        self.assertEquals(entries[0]['slug'], 'user-details')
+        self.assertEquals(entries[1]['fields'], {'first_name': 4})
+        self.assertTrue(entries[1]['invalid'])
+        self.assertFalse('invalid' in entries[2])
+        self.assertEquals(len(set(entry['session'] for entry in entries)), 1)
+
+    def test_values_are_left_out(self):
+        self.client.post('/simpletest/user-details', {
+            'first_name': 'Chad',
+            'email': 'cgallemore@gmail.com'})
+        self.client.get('/simpletest/validate', {
+            'step': 'user-details', 'field': 'email', 'email': 'chad'})
+
+        with open(self.path) as stream:
+            content = stream.read()
+
+        self.assertFalse('Chad' in content)
+        self.assertFalse('cgallemore' in content)
+        self.assertFalse(self.client.session.session_key in content)
+        self.assertEquals(self._entries()[1]['fields'], {'step':
+            'user-details', 'field': 'email', 'email': 4})
@@ -0,0 +1,50 @@
+from django import forms as django_forms
+from django.test import TestCase
+from django.utils import simplejson
+
+from merlin.tests.fixtures.testproject import forms
+from merlin.wizards.schema import *
+
+
+class ChoicesForm(django_forms.Form):
+    size = django_forms.ChoiceField(choices=(('<s>', 'Small'),
+        ('Large', (('l', 'Large'), ('xl', 'Extra large')))))
+    code = django_forms.RegexField(r'^[A-Z]{3}$', required=False)
+    price = django_forms.DecimalField(max_value=10, max_digits=4,
+        decimal_places=2)
+    note = django_forms.CharField(max_length=10)
+
+
+class SchemaTest(TestCase):
+
+    def test_field_types(self):
+        schema = get_form_schema(forms.SocialForm)
+
+        self.assertEquals(schema['fields']['twitter'],
+            {'type': 'url', 'required': True})
+
+        schema = get_form_schema(forms.UserDetailsForm)
+
+        self.assertEquals(schema['fields']['email']['type'], 'email')
+        self.assertEquals(schema['fields']['first_name']['type'], 'text')
+
+    def test_attributes(self):
+        fields = get_form_schema(ChoicesForm)['fields']
+
+        self.assertEquals(fields['size']['choices'], [u'<s>', u'l', u'xl'])
+        self.assertEquals(fields['code'], {'type': 'regex',
+            'required': False, 'pattern': r'^[A-Z]{3}$'})
+        self.assertEquals(fields['price']['max_value'], 10)
+        self.assertEquals(fields['price']['decimal_places'], 2)
+        self.assertEquals(fields['note']['max_length'], 10)
+
+    def test_computed_once_per_form(self):
+        self.assertTrue(get_form_schema(ChoicesForm) is
+            get_form_schema(ChoicesForm))
+
+    def test_json(self):
+        content = get_form_schema_json(ChoicesForm)
+
+        self.assertFalse('<' in content)
+        self.assertEquals(simplejson.loads(content),
+            simplejson.loads(simplejson.dumps(get_form_schema(ChoicesForm))))
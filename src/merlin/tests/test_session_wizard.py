@@ -1,11 +1,26 @@
+import cPickle as pickle
+import warnings
+from StringIO import StringIO
+
 from BeautifulSoup import BeautifulSoup
+from django import forms as django_forms
+from django.conf import settings
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
 from django.test import TestCase
+from django.test.client import RequestFactory
+from django.utils import simplejson
+from django.utils.importlib import import_module
 
 from merlin.tests.fixtures.testproject import forms
-from merlin.wizards import MissingStepException, MissingSlugException
-from merlin.wizards.session import SessionWizard
-from merlin.wizards.utils import Step
+from merlin.tests.fixtures.testproject.wizard import MockWizard
+from merlin.wizards import MissingBlobException, MissingStepException, \
+    MissingSlugException
+from merlin.wizards import prefetch
+from merlin.wizards.files import StoredFile, get_file_storage
+from merlin.wizards.session import SessionWizard, _wizards
+from merlin.wizards.stores import CacheStateStore, SessionStateStore
+from merlin.wizards.utils import Step, SummaryStep
 
 
 class SessionWizardTest(TestCase):
@@ -154,6 +169,37 @@ class SessionWizardTest(TestCase):
         self.assertEquals(response.status_code, 200)
 
 
+    def test_namespace(self):
+        wizard = SessionWizard([
+            Step('user-details', forms.UserDetailsForm)], namespace='test')
+
+        self.assertEquals(wizard.id, 'merlin.wizards.session.SessionWizard:test')
+
+        self.client.get('/simpletest/user-details')
+
+        self.assertTrue('merlin.wizards.session.SessionWizard:simpletest' in
+            self.client.session)
+
+    def test_least_recently_used_wizard_is_evicted(self):
+        settings.MERLIN_MAX_WIZARDS = 1
+
+        try:
+            self.client.get('/simpletest/user-details')
+            self.client.get('/bettertest/user-details')
+
+            session = self.client.session
+
+            self.assertFalse('merlin.wizards.session.SessionWizard:simpletest'
+                in session)
+            self.assertTrue('merlin.tests.fixtures.testproject.wizard.MockWizard'
+                in session)
+            self.assertEquals(session['merlin.wizards'],
+                ['merlin.tests.fixtures.testproject.wizard.MockWizard'])
+
+        finally:
+            del settings.MERLIN_MAX_WIZARDS
+
+
 class MockWizardTest(TestCase):
 
     def test_mock_wizard(self):
@@ -201,3 +247,752 @@ class MockWizardTest(TestCase):
 
         self.assertEquals(post.status_code, 200)
         self.assertEquals(post.content, 'All done')
+
+
+class UploadWizardTest(TestCase):
+
+    def _upload(self, content='Some document'):
+        document = StringIO(content)
+        document.name = 'document.txt'
+
+        return self.client.post('/uploadtest/document', {
+            'title': 'My document',
+            'document': document
+        })
+
+    def _stored_file(self):
+        state = self.client.session['merlin.tests.fixtures.testproject.wizard.UploadWizard']
+
+        return state.form_data['document']['document']
+
+    def test_upload_is_kept_out_of_session(self):
+        self.client.get('/uploadtest/document')
+        post = self._upload()
+
+        self.assertEquals(post.status_code, 302)
+
+        stored = self._stored_file()
+
+        self.assertTrue(isinstance(stored, StoredFile))
+        self.assertEquals(stored.name, 'document.txt')
+        self.assertEquals(stored.size, 13)
+        self.assertTrue(get_file_storage().exists(stored.path))
+
+    def test_upload_is_rebound_and_cleaned_up(self):
+        self.client.get('/uploadtest/document')
+        self._upload()
+        stored = self._stored_file()
+
+        # Posting the step again without a new upload keeps the stored file.
+        post = self.client.post('/uploadtest/document', {
+            'title': 'Renamed document'
+        })
+
+        self.assertEquals(post.status_code, 302)
+        self.assertEquals(self._stored_file(), stored)
+
+        post = self.client.post('/uploadtest/user-details', {
+            'first_name': 'Chad',
+            'last_name': 'Gallemore',
+            'email': 'cgallemore@gmail.com'
+        })
+
+        self.assertEquals(post.content, 'Some document')
+        self.assertFalse(get_file_storage().exists(stored.path))
+
+    def test_replaced_upload_is_deleted(self):
+        self.client.get('/uploadtest/document')
+        self._upload()
+        stored = self._stored_file()
+
+        self._upload('Another document')
+        replacement = self._stored_file()
+
+        self.assertFalse(get_file_storage().exists(stored.path))
+        self.assertTrue(get_file_storage().exists(replacement.path))
+
+        self.client.get('/uploadtest/cancel')
+
+        self.assertFalse(get_file_storage().exists(replacement.path))
+
+
+class CountingStateStore(SessionStateStore):
+    saves = 0
+
+    def save(self, request, wizard_id, state):
+        self.saves += 1
+
+        return super(CountingStateStore, self).save(request, wizard_id, state)
+
+
+class FailingWizard(MockWizard):
+    def process_step(self, request, current_step, form):
+        super(FailingWizard, self).process_step(request, current_step, form)
+
+        raise ValueError('Processing failed')
+
+
+class TemplateListWizard(MockWizard):
+    # Reads the request and returns a list of templates.
+    def get_template(self, request, step, form):
+        return ['forms/%s%s.html' % (request.method.lower(), step.slug),
+            'forms/wizard.html']
+
+
+class PreparingWizard(MockWizard):
+    prepared = []
+
+    def prepare_step(self, step):
+        super(PreparingWizard, self).prepare_step(step)
+        self.prepared.append(step.slug)
+
+
+class CountingForm(forms.UserDetailsForm):
+    renders = 0
+
+    def __unicode__(self):
+        CountingForm.renders += 1
+
+        return super(CountingForm, self).__unicode__()
+
+
+class DroppingExecutor(object):
+    accept = False
+
+    def submit(self, func, *args):
+        return self.accept
+
+
+class RequestFactoryMixin(object):
+
+    def setUp(self):
+        self.session = import_module(settings.SESSION_ENGINE).SessionStore()
+
+    def _request(self, method, data=None, slug='user-details'):
+        request = getattr(RequestFactory(), method)('/wizard/%s' % slug,
+            data or {})
+        request.session = self.session
+
+        return request
+
+    def _steps(self):
+        return [Step('user-details', forms.UserDetailsForm),
+            Step('contact-details', forms.ContactDetailsForm)]
+
+
+class UnitOfWorkTest(RequestFactoryMixin, TestCase):
+
+    def test_one_write_per_request(self):
+        store = CountingStateStore()
+        wizard = MockWizard(self._steps(), store=store, namespace='unitofwork')
+
+        wizard(self._request('get'), slug='user-details')
+
+        self.assertEquals(store.saves, 1)
+
+        wizard(self._request('get'), slug='user-details')
+
+        self.assertEquals(store.saves, 1)
+
+        wizard(self._request('post', {
+            'first_name': 'Chad',
+            'last_name': 'Gallemore',
+            'email': 'cgallemore@gmail.com'
+        }), slug='user-details')
+
+        self.assertEquals(store.saves, 2)
+        self.assertEquals([str(step) for step in self.session[wizard.id].steps],
+            ['user-details', 'few-more-things', 'social-info'])
+
+    def test_changes_dropped_on_exception(self):
+        wizard = FailingWizard(self._steps())
+
+        wizard(self._request('get'), slug='user-details')
+
+        self.assertRaises(ValueError, wizard, self._request('post', {
+            'first_name': 'Chad',
+            'last_name': 'Gallemore',
+            'email': 'cgallemore@gmail.com'
+        }), slug='user-details')
+
+        state = self.session[wizard.id]
+
+        self.assertEquals(state.version, 1)
+        self.assertDictEqual(state.form_data, {})
+        self.assertEquals([str(step) for step in state.steps],
+            ['user-details', 'contact-details'])
+
+    def test_modifies_session_alias(self):
+        from merlin.wizards.session import modifies_session
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+
+            class OldWizard(MockWizard):
+                @modifies_session
+                def reset(self, request):
+                    self._get_state(request)
+
+        self.assertEquals([warning.category for warning in caught],
+            [DeprecationWarning])
+
+        wizard = OldWizard(self._steps(), store=CountingStateStore())
+        request = self._request('get')
+        wizard(request, slug='user-details')
+        wizard.reset(request)
+
+        self.assertTrue(wizard._get_work(request).dirty)
+
+
+class EvictionTest(RequestFactoryMixin, TestCase):
+
+    def test_second_instance_warns(self):
+        wizard = SessionWizard(self._steps(), namespace='evictiontest')
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            SessionWizard(self._steps(), namespace='evictiontest')
+
+        self.assertEquals([warning.category for warning in caught],
+            [RuntimeWarning])
+
+    def test_evicted_wizard_without_instance_is_cleared(self):
+        settings.MERLIN_MAX_WIZARDS = 1
+        settings.MERLIN_BLOB_THRESHOLD = 100
+
+        try:
+            store = CacheStateStore()
+            wizard = SessionWizard(self._steps(), store=store,
+                namespace='evicted')
+            wizard(self._request('get'), slug='user-details')
+            wizard(self._request('post', {
+                'first_name': 'x' * 200,
+                'last_name': 'Gallemore',
+                'email': 'cgallemore@gmail.com'
+            }), slug='user-details')
+
+            blob = store.load(self._request('get'),
+                wizard.id).form_data['user-details']['first_name']
+            wizard_id = wizard.id
+            del wizard
+
+            self.assertEquals(_wizards.get(wizard_id, None), None)
+
+            SessionWizard(self._steps(), namespace='evicting')(
+                self._request('get'), slug='user-details')
+
+            self.assertEquals(store.load(self._request('get'), wizard_id),
+                None)
+            self.assertRaises(MissingBlobException, blob.load)
+
+        finally:
+            del settings.MERLIN_MAX_WIZARDS
+            del settings.MERLIN_BLOB_THRESHOLD
+
+
+class CompileTest(TestCase):
+
+    def test_step_info(self):
+        steps = [
+            Step('user-details', forms.UserDetailsForm),
+            Step('contact-details', forms.ContactDetailsForm)]
+        wizard = SessionWizard(steps, namespace='compiletest')
+        extra = Step('few-more-things', forms.FewMoreThingsForm)
+
+        self.assertEquals(wizard.slug_index,
+            {'user-details': 0, 'contact-details': 1})
+        self.assertEquals(wizard.get_step_info(steps[1])['index'], 1)
+        self.assertEquals(wizard.get_step_info(steps[0])['fields'],
+            ('first_name', 'last_name', 'email'))
+        self.assertIsNone(wizard.get_step_info(extra)['index'])
+        self.assertTrue(wizard.get_step_info(extra) is
+            wizard.get_step_info(extra))
+
+    def test_compile(self):
+        wizard = MockWizard([
+            Step('user-details', forms.UserDetailsForm),
+            Step('contact-details', forms.ContactDetailsForm)],
+            namespace='compiletest')
+
+        template_debug = settings.TEMPLATE_DEBUG
+        settings.TEMPLATE_DEBUG = False
+
+        try:
+            self.assertTrue(wizard.compile() is wizard)
+
+        finally:
+            settings.TEMPLATE_DEBUG = template_debug
+
+        self.assertEquals(wizard._templates.keys(), ['forms/wizard.html'])
+
+    def test_template_lists(self):
+        wizard = TemplateListWizard([
+            Step('user-details', forms.UserDetailsForm),
+            Step('contact-details', forms.ContactDetailsForm)],
+            namespace='compiletest')
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            wizard.compile()
+
+        self.assertEquals(caught, [])
+
+        request = RequestFactory().get('/wizard/user-details')
+        request.session = import_module(
+            settings.SESSION_ENGINE).SessionStore()
+
+        self.assertEquals(wizard(request, slug='user-details').status_code,
+            200)
+
+        request.META['HTTP_X_MERLIN_FRAGMENT'] = '1'
+
+        self.assertEquals(wizard(request, slug='user-details').status_code,
+            200)
+
+    def test_warmup_command(self):
+        output = StringIO()
+        call_command('merlin_warmup', stdout=output)
+        lines = output.getvalue().splitlines()
+
+        self.assertTrue('Compiled merlin.wizards.session.SessionWizard:'
+            'simpletest' in lines)
+        self.assertTrue('Compiled merlin.tests.fixtures.testproject.wizard.'
+            'MockWizard' in lines)
+
+
+class DateForm(django_forms.Form):
+    date = django_forms.DateField()
+
+    class Media:
+        js = ('js/calendar.js',)
+        css = {'all': ('css/calendar.css',)}
+
+
+class MapForm(django_forms.Form):
+    place = django_forms.CharField()
+
+    class Media:
+        js = ('js/calendar.js', 'js/map.js',)
+
+
+class MediaTest(RequestFactoryMixin, TestCase):
+
+    def _wizard(self):
+        return SessionWizard([Step('user-details', forms.UserDetailsForm),
+            Step('date', DateForm)], namespace='mediatest')
+
+    def test_media_of_all_steps(self):
+        wizard = self._wizard()
+        media = wizard.get_media()
+
+        self.assertEquals(media._js, ['js/calendar.js'])
+        self.assertTrue(wizard.get_media() is media)
+
+        wizard.register_step(Step('map', MapForm))
+
+        self.assertEquals(wizard.get_media()._js,
+            ['js/calendar.js', 'js/map.js'])
+        self.assertEquals(wizard.get_media()._css,
+            {'all': ['css/calendar.css']})
+
+    def test_media_in_context(self):
+        wizard = self._wizard()
+        wizard.register_step(Step('map', MapForm))
+        soup = BeautifulSoup(wizard(self._request('get'),
+            slug='user-details').content)
+
+        sources = [script['src'] for script in soup.head.findAll('script')]
+
+        self.assertEquals(len(sources), 2)
+        self.assertTrue(sources[0].endswith('js/calendar.js'))
+        self.assertTrue(sources[1].endswith('js/map.js'))
+
+    def test_register_step_type_error(self):
+        with self.assertRaises(TypeError):
+            self._wizard().register_step(('map', MapForm))
+
+
+class NavigationTest(TestCase):
+
+    def test_navigation(self):
+        response = self.client.get('/navtest/user-details/user-details/form')
+        navigation = response.context['navigation']
+
+        self.assertEquals(navigation.url_base, '/navtest/user-details/')
+        self.assertEquals(navigation.url_suffix, '/form')
+        self.assertEquals((navigation.number, navigation.total,
+            navigation.percent), (1, 2, 0))
+        self.assertIsNone(navigation.previous)
+        self.assertEquals(navigation.next_url,
+            '/navtest/user-details/contact-details/form')
+        self.assertEquals([item['url'] for item in navigation.steps], [
+            '/navtest/user-details/user-details/form',
+            '/navtest/user-details/contact-details/form'])
+
+        soup = BeautifulSoup(response.content)
+        self.assertEquals(soup.find('p', 'progress').string, 'Step 1 of 2')
+        self.assertEquals(soup.find('a', 'next')['href'],
+            '/navtest/user-details/contact-details/form')
+
+        post = self.client.post('/navtest/user-details/user-details/form', {
+            'first_name': 'Chad',
+            'last_name': 'Gallemore',
+            'email': 'cgallemore@gmail.com'
+        })
+
+        self.assertEquals(post['Location'],
+            'http://testserver/navtest/user-details/contact-details/form')
+
+        response = self.client.get('/navtest/user-details/contact-details/form')
+        navigation = response.context['navigation']
+
+        self.assertEquals((navigation.number, navigation.percent), (2, 50))
+        self.assertEquals(navigation.previous_url,
+            '/navtest/user-details/user-details/form')
+        self.assertEquals(BeautifulSoup(response.content).find('a',
+            'back')['href'], '/navtest/user-details/user-details/form')
+        self.assertEquals([item['completed'] for item in navigation.steps],
+            [True, False])
+        self.assertEquals([item['current'] for item in navigation.steps],
+            [False, True])
+
+
+class ConditionalGetTest(RequestFactoryMixin, TestCase):
+
+    def setUp(self):
+        super(ConditionalGetTest, self).setUp()
+        settings.MERLIN_ETAGS = True
+
+    def tearDown(self):
+        del settings.MERLIN_ETAGS
+
+    def test_not_modified(self):
+        first = self.client.get('/simpletest/user-details')
+
+        # The first request creates the state, so its page can not be reused.
+        self.assertFalse(first.has_header('ETag'))
+
+        response = self.client.get('/simpletest/user-details')
+        etag = response['ETag']
+
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue('private' in response['Cache-Control'])
+
+        response = self.client.get('/simpletest/user-details',
+            HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEquals(response.status_code, 304)
+        self.assertEquals(response['ETag'], etag)
+        self.assertEquals(response.content, '')
+
+        self.client.post('/simpletest/user-details', {
+            'first_name': 'Chad',
+            'last_name': 'Gallemore',
+            'email': 'cgallemore@gmail.com'
+        })
+
+        response = self.client.get('/simpletest/user-details',
+            HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEquals(response.status_code, 200)
+        self.assertNotEquals(response['ETag'], etag)
+
+    def test_not_modified_between_steps(self):
+        store = CountingStateStore()
+        wizard = SessionWizard(self._steps(), store=store,
+            namespace='etagtest')
+
+        wizard(self._request('get'), slug='user-details')
+        wizard(self._request('post', {
+            'first_name': 'Chad',
+            'last_name': 'Gallemore',
+            'email': 'cgallemore@gmail.com'
+        }), slug='user-details')
+        wizard(self._request('get', slug='contact-details'),
+            slug='contact-details')
+        etag = wizard(self._request('get'), slug='user-details')['ETag']
+        wizard(self._request('get', slug='contact-details'),
+            slug='contact-details')
+        saves = store.saves
+
+        request = self._request('get')
+        request.META['HTTP_IF_NONE_MATCH'] = etag
+        response = wizard(request, slug='user-details')
+
+        self.assertEquals(response.status_code, 304)
+        self.assertEquals(response['ETag'], etag)
+        self.assertEquals(store.saves, saves)
+
+    def test_disabled(self):
+        del settings.MERLIN_ETAGS
+
+        self.client.get('/simpletest/user-details')
+        response = self.client.get('/simpletest/user-details')
+
+        self.assertFalse(response.has_header('ETag'))
+
+        settings.MERLIN_ETAGS = True
+
+
+class PrefetchTest(RequestFactoryMixin, TestCase):
+
+    def setUp(self):
+        super(PrefetchTest, self).setUp()
+        settings.MERLIN_PREFETCH_WORKERS = 1
+        settings.MERLIN_PREFETCH_LINKS = True
+        PreparingWizard.prepared = []
+
+    def tearDown(self):
+        del settings.MERLIN_PREFETCH_WORKERS
+        del settings.MERLIN_PREFETCH_LINKS
+
+    def test_next_step_is_prepared(self):
+        wizard = PreparingWizard(self._steps(), namespace='prefetchtest')
+
+        response = wizard(self._request('get'), slug='user-details')
+        wizard(self._request('get'), slug='user-details')
+        prefetch.get_executor().join()
+
+        self.assertEquals(response['Link'],
+            '</wizard/contact-details>; rel=prefetch')
+        self.assertEquals(PreparingWizard.prepared, ['contact-details'])
+
+    def test_prepared_step_is_rendered_once(self):
+        step = Step('counting', CountingForm)
+        wizard = MockWizard([step], namespace='prefetchtest')
+        CountingForm.renders = 0
+        template_debug = settings.TEMPLATE_DEBUG
+        settings.TEMPLATE_DEBUG = False
+
+        try:
+            wizard.prepare_step(step)
+            wizard.prepare_step(step)
+
+        finally:
+            settings.TEMPLATE_DEBUG = template_debug
+
+        self.assertEquals(CountingForm.renders, 1)
+
+    def test_dropped_calls_are_scheduled_again(self):
+        executor = prefetch._executor
+        prefetch._executor = DroppingExecutor()
+
+        try:
+            self.assertFalse(prefetch.schedule('dropped', len, ''))
+
+            prefetch._executor.accept = True
+
+            self.assertTrue(prefetch.schedule('dropped', len, ''))
+            self.assertFalse(prefetch.schedule('dropped', len, ''))
+
+        finally:
+            prefetch._executor = executor
+
+    def test_prefetch_requests_are_not_counted(self):
+        request = self._request('get')
+        request.META['HTTP_X_MOZ'] = 'prefetch'
+
+        self.assertTrue(prefetch.is_prefetch(request))
+        self.assertFalse(prefetch.is_prefetch(self._request('get')))
+
+
+def contact_initial(request, wizard):
+    return {
+        'street_address': '123 Main St',
+        'city': 'Joplin',
+        'state': 'MO',
+        'zipcode': '64801',
+        'phone': '555-1234',
+    }
+
+
+def bio_initial(request, wizard):
+    return {'bio': ''}
+
+
+def never(request, wizard, data):
+    return False
+
+
+class ResolvableStepTest(RequestFactoryMixin, TestCase):
+
+    def _steps(self):
+        return [
+            Step('user-details', forms.UserDetailsForm),
+            Step('contact-details', forms.ContactDetailsForm,
+                initial=contact_initial, resolvable=True),
+            Step('few-more-things', forms.FewMoreThingsForm,
+                initial=bio_initial, resolvable=True),
+            Step('social-info', forms.SocialForm,
+                resolvable=never)]
+
+    def test_resolvable_steps_are_completed(self):
+        store = CountingStateStore()
+        wizard = SessionWizard(self._steps(), store=store,
+            namespace='resolvetest')
+
+        wizard(self._request('get'), slug='user-details')
+        response = wizard(self._request('post', {
+            'first_name': 'Chad',
+            'last_name': 'Gallemore',
+            'email': 'cgallemore@gmail.com'
+        }), slug='user-details')
+
+        # The contact details are completed, the empty bio is not valid.
+        self.assertEquals(response['Location'], '/wizard/few-more-things')
+        self.assertEquals(store.saves, 2)
+
+        state = pickle.loads(pickle.dumps(self.session[wizard.id]))
+        form_data = state.form_data
+
+        self.assertEquals(state.steps[1].initial, contact_initial)
+        self.assertEquals(sorted(form_data),
+            ['contact-details', 'user-details'])
+        self.assertEquals(form_data['contact-details']['city'], 'Joplin')
+
+    def test_initial_data_prefills_the_form(self):
+        wizard = MockWizard(self._steps(), namespace='resolvetest')
+        response = wizard(self._request('get'), slug='contact-details')
+
+        soup = BeautifulSoup(response.content)
+
+        self.assertEquals(soup.find('input', id='id_city')['value'], 'Joplin')
+
+
+class SummaryStepTest(RequestFactoryMixin, TestCase):
+
+    def _steps(self):
+        return [Step('user-details', forms.UserDetailsForm),
+            Step('contact-details', forms.ContactDetailsForm),
+            SummaryStep('summary')]
+
+    def _summary(self):
+        wizard = SessionWizard(self._steps(), namespace='summarytest')
+
+        wizard(self._request('post', {
+            'first_name': 'Chad',
+            'last_name': 'Gallemore',
+            'email': 'cgallemore@gmail.com'
+        }), slug='user-details')
+        wizard(self._request('post', {
+            'street_address': '123 Main St',
+            'city': 'Joplin',
+            'state': 'MO',
+            'zipcode': '64801',
+            'phone': '417-555-0100'
+        }, slug='contact-details'), slug='contact-details')
+
+        return BeautifulSoup(wizard(self._request('get', slug='summary'),
+            slug='summary').content)
+
+    def test_completed_steps_are_shown(self):
+        soup = self._summary()
+        links = soup.find('dl', 'summary').findAll('a')
+
+        self.assertEquals([link['href'] for link in links],
+            ['/wizard/user-details', '/wizard/contact-details'])
+        self.assertEquals(soup.find('dd', 'first_name').string,
+            'First name: Chad')
+
+    def test_lookups_in_threads(self):
+        settings.MERLIN_SUMMARY_WORKERS = 2
+
+        try:
+            soup = self._summary()
+
+        finally:
+            del settings.MERLIN_SUMMARY_WORKERS
+
+        self.assertEquals(soup.find('dd', 'email').string,
+            'Email: cgallemore@gmail.com')
+        self.assertEquals(soup.find('dd', 'city').string, 'City: Joplin')
+
+    def test_summary_step_is_unpickled_as_such(self):
+        step = pickle.loads(pickle.dumps(self._steps()[2]))
+
+        self.assertTrue(isinstance(step, SummaryStep))
+
+
+class ValidateTest(TestCase):
+    wizard_id = 'merlin.wizards.session.SessionWizard:simpletest'
+
+    def test_only_named_fields_are_validated(self):
+        response = self.client.post('/simpletest/validate', {
+            'step': 'user-details', 'field': ['email', 'first_name'],
+            'email': 'not an email'})
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response['Content-Type'], 'application/json')
+
+        errors = simplejson.loads(response.content)['errors']
+
+        self.assertEquals(sorted(errors), ['email', 'first_name'])
+        self.assertEquals(errors['email'], [u'Enter a valid e-mail address.'])
+
+    def test_fields_default_to_the_submitted_ones(self):
+        response = self.client.get('/simpletest/validate', {
+            'step': 'user-details', 'email': 'joe@example.com'})
+
+        self.assertEquals(simplejson.loads(response.content),
+            {'errors': {}})
+
+    def test_state_is_not_written(self):
+        self.client.post('/simpletest/validate', {
+            'step': 'user-details', 'email': 'joe@example.com'})
+
+        self.assertFalse(self.wizard_id in self.client.session.keys())
+
+        self.client.get('/simpletest/user-details')
+        state = dict(self.client.session[self.wizard_id])
+
+        self.client.post('/simpletest/validate', {
+            'step': 'contact-details', 'city': ''})
+
+        self.assertEquals(dict(self.client.session[self.wizard_id]), state)
+
+    def test_unknown_step(self):
+        with self.assertRaises(MissingStepException):
+            self.client.post('/simpletest/validate', {'step': 'missing'})
+
+    def test_schema(self):
+        response = self.client.get('/simpletest/validate', {
+            'step': 'user-details', 'schema': ''})
+        schema = simplejson.loads(response.content)['schema']
+
+        self.assertEquals(schema['fields']['email']['type'], 'email')
+
+    def test_schema_in_context(self):
+        response = self.client.get('/simpletest/user-details')
+        soup = BeautifulSoup(response.content)
+        schema = simplejson.loads(soup.find('script',
+            id='validation-schema').string)
+
+        self.assertEquals(sorted(schema['fields']),
+            ['email', 'first_name', 'last_name'])
+
+
+class FragmentTest(TestCase):
+
+    def test_fragment(self):
+        self.client.get('/simpletest/user-details')
+        response = self.client.get('/simpletest/contact-details',
+            HTTP_X_MERLIN_FRAGMENT='1')
+
+        self.assertFalse('<html' in response.content)
+        self.assertFalse('class="progress"' in response.content)
+        self.assertTrue(BeautifulSoup(response.content).find('input',
+            id='id_street_address'))
+        self.assertEquals(response['X-Merlin-Step'], 'contact-details')
+        self.assertEquals(response['X-Merlin-Step-Number'], '2')
+        self.assertEquals(response['X-Merlin-Step-Total'], '2')
+        self.assertEquals(response['X-Merlin-Previous'],
+            '/simpletest/user-details')
+        self.assertFalse(response.has_header('X-Merlin-Next'))
+        self.assertTrue('X-Merlin-Fragment' in response['Vary'])
+
+    def test_full_page(self):
+        response = self.client.get('/simpletest/user-details')
+
+        self.assertTrue('<html' in response.content)
+        self.assertFalse(response.has_header('X-Merlin-Step'))
+        self.assertTrue('X-Merlin-Fragment' in response['Vary'])
@@ -0,0 +1,322 @@
+from BeautifulSoup import BeautifulSoup
+from django.conf import settings
+from django.http import QueryDict
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.utils.importlib import import_module
+
+from merlin.models import WizardSnapshot
+from merlin.tests.fixtures.testproject.forms import *
+from merlin.wizards import MissingStepException, StateConflictException
+from merlin.wizards.stores import *
+from merlin.wizards.utils import *
+
+
+class StateStoreTestCase(TestCase):
+    def setUp(self):
+        self.engine = import_module(settings.SESSION_ENGINE)
+        session = self.engine.SessionStore()
+        session.save()
+        self.session_key = session.session_key
+
+        self.step1 = Step('step1', UserDetailsForm)
+        self.step2 = Step('step2', ContactDetailsForm)
+        self.extra = Step('extra', FewMoreThingsForm)
+
+    def _request(self):
+        request = RequestFactory().get('/')
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = self.session_key
+        request.session = self.engine.SessionStore(self.session_key)
+
+        return request
+
+    def _start(self, store):
+        request = self._request()
+        store.save(request, 'wizard', WizardState(
+            steps=[self.step1, self.step2], current_step=self.step1,
+            form_data={}))
+        request.session.save()
+
+    def _parallel_requests(self, store):
+        self._start(store)
+
+        first, second = self._request(), self._request()
+        first_state = store.load(first, 'wizard')
+        second_state = store.load(second, 'wizard')
+
+        return first, first_state, second, second_state
+
+    def test_session_store_merges_parallel_changes(self):
+        store = SessionStateStore(verify=True)
+        first, first_state, second, second_state = \
+            self._parallel_requests(store)
+
+        first_state.insert_after(self.step1, self.extra)
+        store.save(first, 'wizard', first_state)
+        first.session.save()
+
+        second_state.set_cleaned_data('step1', {'first_name': 'Chad'})
+        saved = store.save(second, 'wizard', second_state)
+        second.session.save()
+
+        self.assertEquals(saved.version, 3)
+        self.assertListEqual(saved.steps, [self.step1, self.extra, self.step2])
+        self.assertDictEqual(saved.form_data, {'step1': {'first_name': 'Chad'}})
+
+        saved = store.load(self._request(), 'wizard')
+
+        self.assertListEqual(saved.steps, [self.step1, self.extra, self.step2])
+        self.assertDictEqual(saved.form_data, {'step1': {'first_name': 'Chad'}})
+
+    def test_session_store_does_not_read_back_by_default(self):
+        store = SessionStateStore()
+        first, first_state, second, second_state = \
+            self._parallel_requests(store)
+
+        first_state.insert_after(self.step1, self.extra)
+        store.save(first, 'wizard', first_state)
+        first.session.save()
+
+        second_state.set_cleaned_data('step1', {'first_name': 'Chad'})
+        with self.assertNumQueries(0):
+            saved = store.save(second, 'wizard', second_state)
+
+        self.assertEquals(saved.version, 2)
+        self.assertListEqual(saved.steps, [self.step1, self.step2])
+
+    def test_cache_store_merges_parallel_changes(self):
+        store = CacheStateStore()
+        first, first_state, second, second_state = \
+            self._parallel_requests(store)
+
+        first_state.insert_after(self.step1, self.extra)
+        store.save(first, 'wizard', first_state)
+
+        second_state.set_cleaned_data('step1', {'first_name': 'Chad'})
+        store.save(second, 'wizard', second_state)
+
+        saved = store.load(self._request(), 'wizard')
+
+        self.assertEquals(saved.version, 3)
+        self.assertListEqual(saved.steps, [self.step1, self.extra, self.step2])
+        self.assertDictEqual(saved.form_data, {'step1': {'first_name': 'Chad'}})
+
+    def test_event_log_store_merges_parallel_changes(self):
+        store = EventLogStateStore()
+        first, first_state, second, second_state = \
+            self._parallel_requests(store)
+
+        first_state.insert_after(self.step1, self.extra)
+        store.save(first, 'wizard', first_state)
+
+        second_state.set_cleaned_data('step1', {'first_name': 'Chad'})
+        store.save(second, 'wizard', second_state)
+
+        saved = store.load(self._request(), 'wizard')
+
+        self.assertEquals(saved.version, 3)
+        self.assertListEqual(saved.steps, [self.step1, self.extra, self.step2])
+        self.assertDictEqual(saved.form_data, {'step1': {'first_name': 'Chad'}})
+
+    def test_event_log_store_keeps_history_on_delete(self):
+        store = EventLogStateStore(keep_history=True)
+        self._start(store)
+
+        request = self._request()
+        state = store.load(request, 'wizard')
+        state.set_cleaned_data('step1', {'first_name': 'Chad'})
+        store.save(request, 'wizard', state)
+        store.delete(request, 'wizard')
+
+        self.assertEquals(store.load(self._request(), 'wizard'), None)
+        self.assertEquals([sequence for sequence, created, changes in
+            store.get_history(self.session_key, 'wizard')], [2])
+
+        self._start(store)
+        request = self._request()
+        state = store.load(request, 'wizard')
+
+        self.assertEquals(state.version, 3)
+        self.assertDictEqual(state.form_data, {})
+
+        state.set_cleaned_data('step2', {'email': 'cgallemore@gmail.com'})
+        store.save(request, 'wizard', state)
+
+        self.assertEquals([sequence for sequence, created, changes in
+            store.get_history(self.session_key, 'wizard')], [2, 4])
+        self.assertDictEqual(store.load(self._request(), 'wizard').form_data,
+            {'step2': {'email': 'cgallemore@gmail.com'}})
+
+    def test_event_log_store_snapshots(self):
+        store = EventLogStateStore(snapshot_interval=3, keep_history=True)
+        self._start(store)
+
+        request = self._request()
+        state = store.load(request, 'wizard')
+
+        for slug in ('a', 'b', 'c'):
+            state.set_cleaned_data(slug, {'value': slug})
+            state = store.save(request, 'wizard', state)
+
+        self.assertEquals(WizardSnapshot.objects.filter(
+            wizard_id='wizard').get().sequence, 3)
+        self.assertEquals([sequence for sequence, created, changes in
+            store.get_history(self.session_key, 'wizard')], [2, 3, 4])
+
+        saved = store.load(self._request(), 'wizard')
+
+        self.assertEquals(saved.version, 4)
+        self.assertDictEqual(saved.form_data, {'a': {'value': 'a'},
+            'b': {'value': 'b'}, 'c': {'value': 'c'}})
+
+        store.delete(self._request(), 'wizard')
+
+        self.assertIsNone(store.load(self._request(), 'wizard'))
+
+    def test_conflicting_changes(self):
+        store = CacheStateStore()
+        first, first_state, second, second_state = \
+            self._parallel_requests(store)
+
+        first_state.remove_step(self.step2)
+        store.save(first, 'wizard', first_state)
+
+        second_state.insert_after(self.step2, self.extra)
+
+        self.assertRaises(StateConflictException, store.save, second,
+            'wizard', second_state)
+
+    def test_cache_store_wizard(self):
+        self.client.get('/cachetest/user-details')
+        self.client.post('/cachetest/user-details', {
+            'first_name': 'Chad',
+            'last_name': 'Gallemore',
+            'email': 'cgallemore@gmail.com'
+        })
+        self.client.post('/cachetest/few-more-things', {'bio': 'My bio'})
+        post = self.client.post('/cachetest/social-info', {
+            'twitter': 'http://twitter.com/localbase',
+            'facebook': 'http://facebook.com/localbase'
+        })
+
+        self.assertEquals(post.content, 'All done')
+        self.assertFalse('merlin.tests.fixtures.testproject.wizard.MockWizard'
+            in self.client.session)
+
+
+class SignedCookieStateStoreTestCase(TestCase):
+    cookie_name = SignedCookieStateStore()._cookie_name(
+        'merlin.tests.fixtures.testproject.wizard.MockWizard:statelesstest')
+
+    def _complete_wizard(self):
+        self.client.get('/statelesstest/user-details')
+        self.client.post('/statelesstest/user-details', {
+            'first_name': 'Chad',
+            'last_name': 'Gallemore',
+            'email': 'cgallemore@gmail.com'
+        })
+        self.client.post('/statelesstest/few-more-things', {'bio': 'My bio'})
+
+        return self.client.post('/statelesstest/social-info', {
+            'twitter': 'http://twitter.com/localbase',
+            'facebook': 'http://facebook.com/localbase'
+        })
+
+    def test_state_is_kept_on_the_client(self):
+        post = self._complete_wizard()
+
+        self.assertEquals(post.content, 'All done')
+        self.assertFalse(settings.SESSION_COOKIE_NAME in self.client.cookies)
+        self.assertEquals(self.client.cookies[self.cookie_name].value, '')
+
+    def test_tampered_state_is_ignored(self):
+        self.client.get('/statelesstest/user-details')
+        self.client.post('/statelesstest/user-details', {
+            'first_name': 'Chad',
+            'last_name': 'Gallemore',
+            'email': 'cgallemore@gmail.com'
+        })
+
+        token = self.client.cookies[self.cookie_name].value
+        payload, signature = token.rsplit(':', 1)
+        self.client.cookies[self.cookie_name] = '%s:%s' % (payload, '0' * 40)
+
+        self.assertRaises(MissingStepException, self.client.get,
+            '/statelesstest/few-more-things')
+
+    def test_expired_state_is_ignored(self):
+        self.client.get('/statelesstest/user-details')
+        self.client.post('/statelesstest/user-details', {
+            'first_name': 'Chad',
+            'last_name': 'Gallemore',
+            'email': 'cgallemore@gmail.com'
+        })
+        settings.MERLIN_STATELESS_MAX_AGE = -1
+
+        try:
+            self.assertRaises(MissingStepException, self.client.get,
+                '/statelesstest/few-more-things')
+
+        finally:
+            del settings.MERLIN_STATELESS_MAX_AGE
+
+    def test_client_values_are_not_echoed(self):
+        response = self.client.post('/statelesstest/user-details', {
+            'merlin_state': '"><script>alert(1)</script>'})
+        field = BeautifulSoup(response.content).find('input',
+            attrs={'name': 'merlin_state'})
+
+        self.assertFalse('<script>' in response.content)
+        self.assertEquals(field['value'],
+            self.client.cookies[self.cookie_name].value)
+
+    def test_wizard_without_cookies(self):
+        def request(method, url, data=None):
+            response = getattr(self.client, method)(url, data or {})
+            self.client.cookies.clear()
+
+            return response
+
+        def state_field(response):
+            return BeautifulSoup(response.content).find('input',
+                attrs={'name': 'merlin_state'})['value']
+
+        response = request('get', '/statelesstest/user-details')
+        response = request('post', '/statelesstest/user-details', {
+            'first_name': 'Chad',
+            'last_name': 'Gallemore',
+            'email': 'cgallemore@gmail.com',
+            'merlin_state': state_field(response),
+        })
+
+        self.assertEquals(response.status_code, 302)
+
+        path, query = response['Location'].split('?')
+        response = request('get', path, QueryDict(query))
+
+        self.assertEquals(response.status_code, 200)
+
+        response = request('post', path, {
+            'bio': 'My bio', 'merlin_state': state_field(response)})
+        path, query = response['Location'].split('?')
+        response = request('get', path, QueryDict(query))
+        response = request('post', path, {
+            'twitter': 'http://twitter.com/localbase',
+            'facebook': 'http://facebook.com/localbase',
+            'merlin_state': state_field(response),
+        })
+
+        self.assertEquals(response.content, 'All done')
+
+    def test_large_state_falls_back_to_session(self):
+        settings.MERLIN_STATELESS_MAX_SIZE = 10
+
+        try:
+            self.client.get('/statelesstest/user-details')
+
+            self.assertEquals(self.client.cookies[self.cookie_name].value,
+                'server')
+            self.assertTrue(settings.SESSION_COOKIE_NAME in self.client.cookies)
+
+        finally:
+            del settings.MERLIN_STATELESS_MAX_SIZE
@@ -0,0 +1,44 @@
+from django import forms
+from django.test import TestCase
+
+from merlin.wizards.files import StoredFile
+from merlin.wizards.summary import *
+from merlin.wizards.utils import Step
+
+
+class OrderForm(forms.Form):
+    size = forms.ChoiceField(choices=(('s', 'Small'),
+        ('Large', (('l', 'Large'), ('xl', 'Extra large')))))
+    toppings = forms.MultipleChoiceField(choices=(('ham', 'Ham'),
+        ('egg', 'Egg')))
+    gift = forms.BooleanField(required=False, label='Is it a gift?')
+    card = forms.FileField(required=False)
+    note = forms.CharField(required=False)
+
+
+class SummaryTest(TestCase):
+
+    def test_labels(self):
+        fields = get_display_fields(OrderForm)
+
+        self.assertEquals([(name, label) for name, label, display in fields],
+            [('size', 'Size'), ('toppings', 'Toppings'),
+            ('gift', 'Is it a gift?'), ('card', 'Card'), ('note', 'Note')])
+        self.assertTrue(get_display_fields(OrderForm) is fields)
+
+    def test_display(self):
+        summary = summarize_step(Step('order', OrderForm), {
+            'size': 'xl',
+            'toppings': ['egg', 'ham'],
+            'gift': False,
+            'card': StoredFile('abc/card.png', 'card.png'),
+        })
+        display = dict((field['name'], field['display'])
+            for field in summary['fields'])
+
+        self.assertEquals(display, {'size': u'Extra large',
+            'toppings': u'Egg, Ham', 'gift': u'no', 'card': u'card.png'})
+
+    def test_map_steps_keeps_the_order(self):
+        self.assertEquals(map_steps(lambda step: step * 2, [1, 2, 3]),
+            [2, 4, 6])
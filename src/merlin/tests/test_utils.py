@@ -1,9 +1,28 @@
+import pickle
 import unittest
+from UserDict import UserDict
 
 from merlin.tests.fixtures.testproject.forms import *
 from merlin.wizards.utils import *
 
 
+class LegacyWizardState(UserDict):
+    # The WizardState of the 0.8 release, to check old pickles still load.
+    def __init__(self, *args, **kwargs):
+        UserDict.__init__(self, *args, **kwargs)
+
+        self.steps = kwargs.get('steps', None)
+        self.current_step = kwargs.get('current_step', None)
+        self.form_data = kwargs.get('form_data', None)
+
+
+class TemplateStep(Step):
+    # A subclass with its own arguments and attributes.
+    def __init__(self, slug, form, template):
+        super(TemplateStep, self).__init__(slug, form)
+        self.template = template
+
+
 class UtilsTestCase(unittest.TestCase):
     def test_init_with_no_params(self):
         state = WizardState()
@@ -41,6 +60,31 @@ class UtilsTestCase(unittest.TestCase):
 
         self.assertEquals('Step: %s' % repr(step1), 'Step: step1')
 
+    def test_changes_are_recorded(self):
+        step1 = Step('step1', ContactDetailsForm)
+        step2 = Step('step2', UserDetailsForm)
+
+        state = WizardState(steps=[step1], current_step=step1, form_data={})
+        state.insert_after(step1, step2)
+        state.set_cleaned_data('step1', {'city': 'Joplin'})
+
+        self.assertEquals(state.changes, [
+            ('insert_after', (step1, step2)),
+            ('set_cleaned_data', ('step1', {'city': 'Joplin'}))])
+
+        copy = pickle.loads(pickle.dumps(state))
+
+        self.assertListEqual(copy.changes, [])
+        self.assertListEqual(copy.steps, [step1, step2])
+
+        other = WizardState(steps=[step1], current_step=step1, form_data={})
+
+        for change in state.changes:
+            other.apply(change)
+
+        self.assertListEqual(other.steps, [step1, step2])
+        self.assertDictEqual(other.form_data, {'step1': {'city': 'Joplin'}})
+
     def test_wizard_expansion(self):
         state = WizardState()
 
@@ -61,3 +105,59 @@ class UtilsTestCase(unittest.TestCase):
 
         else:
             self.assertEquals(state.another_param, 'Another Test')
+
+    def test_single_storage_location(self):
+        step1 = Step('step1', ContactDetailsForm)
+        state = WizardState(steps=[step1], current_step=step1, form_data={})
+        state.global_id = '123456789'
+
+        self.assertEquals(state['form_data'], {})
+        self.assertTrue('global_id' in state)
+        self.assertEquals(state['global_id'], '123456789')
+
+        state['other'] = 'value'
+
+        self.assertEquals(state.other, 'value')
+        self.assertRaises(AttributeError, getattr, state, 'missing')
+
+    def test_steps_are_slotted_and_interned(self):
+        step1 = Step('step1', ContactDetailsForm)
+        state = WizardState(steps=[step1], current_step=step1, form_data={})
+
+        self.assertFalse(hasattr(step1, '__dict__'))
+
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            copy = pickle.loads(pickle.dumps(state, protocol))
+
+            self.assertTrue(copy.steps[0] is step1)
+            self.assertTrue(copy.current_step is step1)
+
+    def test_step_subclasses_are_pickled_with_their_attributes(self):
+        step = TemplateStep('step1', ContactDetailsForm, 'forms/step1.html')
+
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            copy = pickle.loads(pickle.dumps(step, protocol))
+
+            self.assertTrue(type(copy) is TemplateStep)
+            self.assertEquals(copy.slug, 'step1')
+            self.assertTrue(copy.form is ContactDetailsForm)
+            self.assertEquals(copy.template, 'forms/step1.html')
+            self.assertIsNone(copy.initial)
+
+    def test_legacy_state_is_loaded(self):
+        step1 = Step('step1', ContactDetailsForm)
+        legacy = LegacyWizardState(steps=[step1], current_step=step1,
+            form_data={'step1': {'city': 'Joplin'}})
+        legacy.global_id = '123456789'
+        pickled = pickle.dumps(legacy).replace(
+            'merlin.tests.test_utils\nLegacyWizardState',
+            'merlin.wizards.utils\nWizardState')
+
+        state = pickle.loads(pickled)
+
+        self.assertTrue(isinstance(state, WizardState))
+        self.assertListEqual(state.steps, [step1])
+        self.assertDictEqual(state.form_data, {'step1': {'city': 'Joplin'}})
+        self.assertEquals(state.global_id, '123456789')
+        self.assertEquals(state.version, 0)
+        self.assertFalse('data' in state)
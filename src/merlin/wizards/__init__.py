@@ -4,3 +4,15 @@ class MissingSlugException(Exception):
 
 class MissingStepException(Exception):
     pass
+
+
+class MissingBlobException(Exception):
+    pass
+
+
+class StateConflictException(Exception):
+    pass
+
+
+class StateSizeException(Exception):
+    pass
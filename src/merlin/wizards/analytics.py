@@ -0,0 +1,167 @@
+import atexit
+import logging
+import threading
+from timeit import default_timer
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from merlin.wizards.utils import import_class
+
+
+__all__ = ('BaseAnalyticsSink', 'LoggingAnalyticsSink',
+    'DatabaseAnalyticsSink', 'get_analytics_sink', 'record', 'flush',)
+
+
+#: The funnel events counted for every step.
+EVENTS = ('view', 'back', 'valid', 'invalid', 'skipped', 'cancel', 'done',)
+
+logger = logging.getLogger('merlin.analytics')
+
+_sinks = {}
+_lock = threading.Lock()
+_counts = {}
+_last_flush = default_timer()
+
+
+def get_analytics_sink():
+    """
+    Returns the analytics sink set in the ``MERLIN_ANALYTICS_SINK`` setting,
+    or ``None`` when funnel analytics are disabled, which is the default.
+    """
+    import_path = getattr(settings, 'MERLIN_ANALYTICS_SINK', None)
+
+    if not import_path:
+        return None
+
+    if import_path not in _sinks:
+        _sinks[import_path] = import_class(import_path)()
+
+    return _sinks[import_path]
+
+
+class BaseAnalyticsSink(object):
+    """
+    Receives the funnel counts collected by the wizards of a process. Point
+    the ``MERLIN_ANALYTICS_SINK`` setting at a subclass to keep them.
+
+    .. versionadded:: 0.9
+    """
+    def flush(self, counts):
+        """
+        Adds the ``counts`` to the ones already kept. ``counts`` is a
+        ``dict`` mapping ``(wizard_id, slug, event)`` tuples to the number of
+        times the event happened since the last flush.
+        """
+        raise NotImplementedError
+
+
+class LoggingAnalyticsSink(BaseAnalyticsSink):
+    """
+    Logs one line per wizard, step and event to the ``merlin.analytics``
+    logger at the ``INFO`` level.
+    """
+    def flush(self, counts):
+        for (wizard_id, slug, event), count in sorted(counts.items()):
+            logger.info('%s %s %s %d', wizard_id, slug, event, count)
+
+
+class DatabaseAnalyticsSink(BaseAnalyticsSink):
+    """
+    Adds the counts to the :class:`~merlin.models.FunnelCount` table, one
+    update per wizard, step and event. This sink needs ``merlin`` in your
+    ``INSTALLED_APPS``.
+    """
+    def flush(self, counts):
+        from merlin.models import FunnelCount
+
+        for (wizard_id, slug, event), count in counts.items():
+            lookup = {'wizard_id': wizard_id, 'slug': slug, 'event': event}
+
+            if FunnelCount.objects.filter(**lookup).update(
+                    count=F('count') + count):
+                continue
+
+            savepoint = transaction.savepoint()
+
+            try:
+                FunnelCount.objects.create(count=count, **lookup)
+                transaction.savepoint_commit(savepoint)
+
+            except IntegrityError:
+                # Another process created the row in the meantime.
+                transaction.savepoint_rollback(savepoint)
+                FunnelCount.objects.filter(**lookup).update(
+                    count=F('count') + count)
+
+
+def record(wizard_id, slug, event):
+    """
+    Counts one ``event`` for the step ``slug`` of a wizard. The counts are
+    kept in memory and handed to the analytics sink at most once every
+    ``MERLIN_ANALYTICS_FLUSH_INTERVAL`` seconds (60 by default), so recording
+    an event never writes anything by itself. Nothing is counted when
+    analytics are disabled.
+    """
+    global _last_flush
+
+    sink = get_analytics_sink()
+
+    if sink is None:
+        return
+
+    interval = getattr(settings, 'MERLIN_ANALYTICS_FLUSH_INTERVAL', 60)
+    counts = None
+
+    with _lock:
+        key = (wizard_id, slug, event)
+        _counts[key] = _counts.get(key, 0) + 1
+        now = default_timer()
+
+        if now - _last_flush >= interval:
+            counts = _take_counts()
+            _last_flush = now
+
+    if counts:
+        _hand_over(sink, counts)
+
+
+def _take_counts():
+    counts = dict(_counts)
+    _counts.clear()
+
+    return counts
+
+
+def _hand_over(sink, counts):
+    try:
+        sink.flush(counts)
+
+    except Exception:
+        logger.exception("Unable to flush the funnel counts.")
+
+        # The counts are kept for the next flush instead of being lost.
+        with _lock:
+            for key, count in counts.items():
+                _counts[key] = _counts.get(key, 0) + count
+
+
+def flush():
+    """
+    Hands the counts collected so far to the analytics sink right away. This
+    is called when the process exits.
+    """
+    global _last_flush
+
+    sink = get_analytics_sink()
+
+    with _lock:
+        counts = _take_counts()
+        _last_flush = default_timer()
+
+    if counts and sink is not None:
+        _hand_over(sink, counts)
+
+
+atexit.register(flush)
@@ -0,0 +1,191 @@
+import cPickle as pickle
+import os
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from merlin.wizards import MissingBlobException
+from merlin.wizards.files import StoredFile
+from merlin.wizards.utils import import_class
+
+
+__all__ = ('BlobReference', 'FileSystemBlobStore', 'CacheBlobStore',
+    'get_blob_store', 'offload_values', 'load_values', 'delete_blobs',)
+
+
+_store = None
+
+
+def get_blob_store():
+    """
+    Returns the side store used for cleaned values that are too large to be
+    kept in the wizard state. The store class can be set with the
+    ``MERLIN_BLOB_STORE`` setting and defaults to
+    :class:`FileSystemBlobStore`.
+    """
+    global _store
+
+    if _store is None:
+        _store = import_class(getattr(settings, 'MERLIN_BLOB_STORE',
+            'merlin.wizards.blobs.FileSystemBlobStore'))()
+
+    return _store
+
+
+class FileSystemBlobStore(object):
+    """
+    Keeps each value in its own file in the ``MERLIN_BLOB_DIR`` directory,
+    which defaults to a ``merlin-blobs`` directory in the system temp
+    directory.
+    """
+    def __init__(self, location=None):
+        self.location = location or getattr(settings, 'MERLIN_BLOB_DIR',
+            os.path.join(tempfile.gettempdir(), 'merlin-blobs'))
+
+        if not os.path.isdir(self.location):
+            os.makedirs(self.location)
+
+    def _path(self, key):
+        return os.path.join(self.location, key)
+
+    def save(self, key, content):
+        with open(self._path(key), 'wb') as blob:
+            blob.write(content)
+
+    def load(self, key):
+        try:
+            with open(self._path(key), 'rb') as blob:
+                return blob.read()
+
+        except IOError:
+            raise MissingBlobException("Blob %s not found." % key)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+
+        except OSError:
+            pass
+
+
+class CacheBlobStore(object):
+    """
+    Keeps values in the Django cache for ``MERLIN_BLOB_TIMEOUT`` seconds,
+    one day by default. Wizards that are left alone for longer than the
+    timeout lose their offloaded values.
+    """
+    def __init__(self, timeout=None):
+        self.timeout = timeout or getattr(settings, 'MERLIN_BLOB_TIMEOUT',
+            60 * 60 * 24)
+
+    def _key(self, key):
+        return 'merlin.blob.%s' % key
+
+    def save(self, key, content):
+        cache.set(self._key(key), content, self.timeout)
+
+    def load(self, key):
+        content = cache.get(self._key(key))
+
+        if content is None:
+            raise MissingBlobException("Blob %s not found." % key)
+
+        return content
+
+    def delete(self, key):
+        cache.delete(self._key(key))
+
+
+class BlobReference(object):
+    """
+    Takes the place of a large cleaned value in the wizard state. The value
+    itself lives in the blob store and is only loaded when it is read.
+
+    .. versionadded:: 0.9
+
+    :param key:
+        The key of the value in the blob store.
+
+    :param size:
+        The size in bytes of the pickled value.
+    """
+    def __init__(self, key, size):
+        self.key = key
+        self.size = size
+
+    def load(self):
+        return pickle.loads(get_blob_store().load(self.key))
+
+    def delete(self):
+        get_blob_store().delete(self.key)
+
+    def __eq__(self, other):
+        if isinstance(other, BlobReference):
+            return self.key == other.key
+
+        return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '<BlobReference: %s (%d bytes)>' % (self.key, self.size)
+
+
+def _get_references(data):
+    if not data:
+        return []
+
+    return [value for value in data.values()
+        if isinstance(value, BlobReference)]
+
+
+def offload_values(data):
+    """
+    Returns a copy of the cleaned form data where every value whose pickled
+    size is above the ``MERLIN_BLOB_THRESHOLD`` setting is written to the
+    blob store and replaced with a :class:`BlobReference`. Nothing is
+    offloaded when the setting is not defined.
+    """
+    threshold = getattr(settings, 'MERLIN_BLOB_THRESHOLD', None)
+    data = dict(data)
+
+    if threshold is not None:
+        for key, value in data.items():
+            if isinstance(value, (BlobReference, StoredFile)):
+                continue
+
+            content = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+            if len(content) > threshold:
+                reference = BlobReference(uuid.uuid4().hex, len(content))
+                get_blob_store().save(reference.key, content)
+                data[key] = reference
+
+    return data
+
+
+def load_values(data):
+    """
+    Returns a copy of the cleaned form data with every
+    :class:`BlobReference` replaced by the value it references.
+    """
+    if not _get_references(data):
+        return data
+
+    return dict((key, value.load() if isinstance(value, BlobReference)
+        else value) for key, value in data.items())
+
+
+def delete_blobs(data, keep=None):
+    """
+    Deletes every value of the cleaned form data kept in the blob store,
+    except the ones also referenced by the cleaned form data in ``keep``.
+    """
+    kept = _get_references(keep)
+
+    for reference in _get_references(data):
+        if reference not in kept:
+            reference.delete()
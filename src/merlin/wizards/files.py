@@ -0,0 +1,166 @@
+import os
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage, get_storage_class
+from django.core.files.uploadedfile import UploadedFile
+
+
+__all__ = ('StoredFile', 'get_file_storage', 'store_files', 'get_stored_files',
+    'delete_stored_files',)
+
+
+_storage = None
+
+
+def get_file_storage():
+    """
+    Returns the storage used to hold uploaded files while a wizard is in
+    progress. The storage class can be set with the ``MERLIN_FILE_STORAGE``
+    setting; by default a ``FileSystemStorage`` rooted at
+    ``MERLIN_FILE_UPLOAD_DIR`` (or a ``merlin`` directory in the system temp
+    directory) is used.
+    """
+    global _storage
+
+    if _storage is None:
+        import_path = getattr(settings, 'MERLIN_FILE_STORAGE', None)
+
+        if import_path:
+            _storage = get_storage_class(import_path)()
+
+        else:
+            location = getattr(settings, 'MERLIN_FILE_UPLOAD_DIR',
+                os.path.join(tempfile.gettempdir(), 'merlin'))
+            _storage = FileSystemStorage(location=location)
+
+    return _storage
+
+
+class StoredFile(File):
+    """
+    A reference to an uploaded file that has been moved to the temporary
+    file storage. Only the reference is pickled into the wizard state, the
+    file contents stay in the storage and are opened lazily the first time
+    they are read.
+
+    .. versionadded:: 0.9
+
+    :param path:
+        The name of the file inside the temporary file storage.
+
+    :param name:
+        The original name of the uploaded file.
+
+    :param content_type:
+        The content type the client sent along with the upload.
+
+    :param size:
+        The size of the file in bytes.
+    """
+    def __init__(self, path, name, content_type=None, size=None, charset=None):
+        self.path = path
+        self.name = name
+        self.content_type = content_type
+        self.charset = charset
+        self.mode = 'rb'
+        self._file = None
+
+        if size is not None:
+            self._size = size
+
+    @classmethod
+    def save(cls, uploaded_file):
+        """
+        Streams the uploaded file into the temporary file storage chunk by
+        chunk and returns a ``StoredFile`` referencing it.
+        """
+        name = os.path.basename(uploaded_file.name)
+        path = get_file_storage().save(
+            os.path.join(uuid.uuid4().hex, name), uploaded_file)
+
+        return cls(path, name, getattr(uploaded_file, 'content_type', None),
+            uploaded_file.size, getattr(uploaded_file, 'charset', None))
+
+    def _get_file(self):
+        if self._file is None:
+            self._file = get_file_storage().open(self.path, 'rb')
+
+        return self._file
+
+    def _set_file(self, file):
+        self._file = file
+
+    file = property(_get_file, _set_file)
+
+    def _get_closed(self):
+        return self._file is None or self._file.closed
+
+    closed = property(_get_closed)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def delete(self):
+        """
+        Removes the file from the temporary file storage.
+        """
+        self.close()
+        get_file_storage().delete(self.path)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_file'] = None
+
+        return state
+
+    def __eq__(self, other):
+        if isinstance(other, StoredFile):
+            return self.path == other.path
+
+        return False
+
+    def __ne__(self, other):
+        return not self == other
+
+
+def store_files(data):
+    """
+    Returns a copy of the cleaned form data with every uploaded file moved
+    to the temporary file storage and replaced with a :class:`StoredFile`.
+    """
+    data = dict(data)
+
+    for key, value in data.items():
+        if isinstance(value, UploadedFile):
+            data[key] = StoredFile.save(value)
+
+    return data
+
+
+def get_stored_files(data):
+    """
+    Returns a ``dict`` of the :class:`StoredFile` values in the cleaned form
+    data, suitable for binding to a form as its ``files``.
+    """
+    if not data:
+        return {}
+
+    return dict((key, value) for key, value in data.items()
+        if isinstance(value, StoredFile))
+
+
+def delete_stored_files(data, keep=None):
+    """
+    Deletes every :class:`StoredFile` referenced by the cleaned form data,
+    except the ones also referenced by the cleaned form data in ``keep``.
+    """
+    kept = get_stored_files(keep).values()
+
+    for stored in get_stored_files(data).values():
+        if stored not in kept:
+            stored.delete()
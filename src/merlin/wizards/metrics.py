@@ -0,0 +1,146 @@
+import cPickle as pickle
+import logging
+from timeit import default_timer
+
+from django.conf import settings
+
+from merlin.wizards import signals
+from merlin.wizards.utils import import_class
+
+
+__all__ = ('BaseMetricsSink', 'LoggingMetricsSink', 'SignalMetricsSink',
+    'get_metrics_sink', 'get_pickled_size', 'gauge', 'timed',)
+
+
+_sinks = {}
+
+
+def get_metrics_sink():
+    """
+    Returns the metrics sink set in the ``MERLIN_METRICS_SINK`` setting, or
+    ``None`` when metrics are disabled, which is the default.
+    """
+    import_path = getattr(settings, 'MERLIN_METRICS_SINK', None)
+
+    if not import_path:
+        return None
+
+    if import_path not in _sinks:
+        _sinks[import_path] = import_class(import_path)()
+
+    return _sinks[import_path]
+
+
+class BaseMetricsSink(object):
+    """
+    Receives the metrics recorded by the wizards. Subclass it to send them to
+    your metrics system and point the ``MERLIN_METRICS_SINK`` setting at the
+    subclass.
+
+    .. versionadded:: 0.9
+    """
+    def timing(self, name, duration, tags):
+        """
+        Records how long, in seconds, the phase ``name`` of a wizard request
+        took. ``tags`` is a ``dict`` with the ``wizard`` id, the ``step`` slug
+        and the HTTP ``method`` of the request.
+        """
+        pass
+
+    def gauge(self, name, value, tags):
+        """
+        Records the current ``value`` of the measure ``name``, like the size
+        in bytes of the wizard state. ``tags`` is the same as for
+        :meth:`timing`.
+        """
+        pass
+
+
+class LoggingMetricsSink(BaseMetricsSink):
+    """
+    Logs the metrics to the ``merlin.metrics`` logger at the ``DEBUG`` level.
+    """
+    logger = logging.getLogger('merlin.metrics')
+
+    def timing(self, name, duration, tags):
+        self.logger.debug('%s %s %s %s %.6f', tags['wizard'], tags['step'],
+            tags['method'], name, duration)
+
+    def gauge(self, name, value, tags):
+        self.logger.debug('%s %s %s %s %d', tags['wizard'], tags['step'],
+            tags['method'], name, value)
+
+
+class SignalMetricsSink(BaseMetricsSink):
+    """
+    Sends the metrics as the Django signals defined in
+    ``merlin.wizards.signals``.
+    """
+    def timing(self, name, duration, tags):
+        signals.timing.send(sender=self.__class__, name=name,
+            duration=duration, tags=tags)
+
+    def gauge(self, name, value, tags):
+        signals.gauge.send(sender=self.__class__, name=name, value=value,
+            tags=tags)
+
+
+def get_pickled_size(value):
+    """
+    Returns the size in bytes of ``value`` once pickled, which is about the
+    space it takes in the session or any other state store.
+    """
+    return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+def gauge(name, value, wizard_id, slug, method):
+    """
+    Sends the ``value`` of the measure ``name`` to the metrics sink, if
+    metrics are enabled.
+    """
+    sink = get_metrics_sink()
+
+    if sink is not None:
+        sink.gauge(name, value, {'wizard': wizard_id, 'step': slug,
+            'method': method})
+
+
+class _Timer(object):
+    def __init__(self, sink, name, tags):
+        self.sink = sink
+        self.name = name
+        self.tags = tags
+
+    def __enter__(self):
+        self.start = default_timer()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.sink.timing(self.name, default_timer() - self.start, self.tags)
+
+
+class _NullTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_null_timer = _NullTimer()
+
+
+def timed(name, wizard_id, slug, method):
+    """
+    Returns a context manager that records how long its block took as the
+    phase ``name`` of a wizard request. When metrics are disabled the same
+    do nothing context manager is returned every time.
+    """
+    sink = get_metrics_sink()
+
+    if sink is None:
+        return _null_timer
+
+    return _Timer(sink, name, {'wizard': wizard_id, 'step': slug,
+        'method': method})
@@ -0,0 +1,137 @@
+import logging
+import Queue
+import threading
+from timeit import default_timer
+
+from django.conf import settings
+from django.db import connections
+
+
+__all__ = ('BoundedExecutor', 'get_executor', 'schedule', 'is_prefetch',)
+
+
+logger = logging.getLogger('merlin.wizards')
+
+_lock = threading.Lock()
+_executor = None
+_scheduled = {}
+
+
+class BoundedExecutor(object):
+    """
+    Runs functions in a fixed number of daemon threads. At most ``size``
+    functions wait for a thread; more are dropped instead of queued, so a
+    busy process never falls behind on preparation work it may not need.
+
+    .. versionadded:: 0.9
+    """
+    def __init__(self, workers, size):
+        self.queue = Queue.Queue(size)
+
+        for index in range(workers):
+            thread = threading.Thread(target=self._work,
+                name='merlin-prefetch-%d' % index)
+            thread.daemon = True
+            thread.start()
+
+    def submit(self, func, *args):
+        """
+        Queues ``func`` to be called with ``args``. Returns ``False`` when
+        the queue is full and the call was dropped.
+        """
+        try:
+            self.queue.put_nowait((func, args))
+
+        except Queue.Full:
+            return False
+
+        return True
+
+    def join(self):
+        """
+        Waits until every queued function has been called.
+        """
+        self.queue.join()
+
+    def _work(self):
+        while True:
+            func, args = self.queue.get()
+
+            try:
+                func(*args)
+
+            except Exception:
+                logger.exception("Preparing a wizard step failed.")
+
+            finally:
+                for connection in connections.all():
+                    connection.close()
+
+                self.queue.task_done()
+
+
+def get_executor():
+    """
+    Returns the executor of the process, or ``None`` when the
+    ``MERLIN_PREFETCH_WORKERS`` setting is not set, which is the default.
+    The ``MERLIN_PREFETCH_QUEUE_SIZE`` setting bounds its queue (100 by
+    default).
+    """
+    global _executor
+
+    workers = getattr(settings, 'MERLIN_PREFETCH_WORKERS', 0)
+
+    if not workers:
+        return None
+
+    with _lock:
+        if _executor is None:
+            _executor = BoundedExecutor(workers,
+                getattr(settings, 'MERLIN_PREFETCH_QUEUE_SIZE', 100))
+
+    return _executor
+
+
+def schedule(key, func, *args):
+    """
+    Calls ``func`` with ``args`` in the background, unless it was already
+    scheduled for the same ``key`` in the last ``MERLIN_PREFETCH_TTL``
+    seconds (60 by default). Returns whether it was scheduled. A call
+    dropped by a full queue is not remembered, so the next request for the
+    same ``key`` tries again.
+    """
+    executor = get_executor()
+
+    if executor is None:
+        return False
+
+    ttl = getattr(settings, 'MERLIN_PREFETCH_TTL', 60)
+    now = default_timer()
+
+    with _lock:
+        if key in _scheduled and now - _scheduled[key] < ttl:
+            return False
+
+        # Reserved before submitting so two requests do not both submit it.
+        _scheduled[key] = now
+
+    if executor.submit(func, *args):
+        return True
+
+    with _lock:
+        if _scheduled.get(key, None) == now:
+            del _scheduled[key]
+
+    return False
+
+
+def is_prefetch(request):
+    """
+    Returns whether the request was sent by the browser to prefetch the page
+    rather than by the user.
+    """
+    meta = request.META
+
+    return 'prefetch' in (meta.get('HTTP_PURPOSE', ''),
+        meta.get('HTTP_X_MOZ', ''),
+        meta.get('HTTP_SEC_PURPOSE', '').split(';')[0])
@@ -0,0 +1,83 @@
+import cProfile
+import os
+import pstats
+import random
+import re
+import tempfile
+import threading
+
+from django.conf import settings
+
+
+__all__ = ('get_profile_dir', 'should_profile', 'profile',)
+
+
+_lock = threading.Lock()
+_stats = {}
+
+
+def get_profile_dir():
+    """
+    Returns the directory the profiles are dumped to, set with the
+    ``MERLIN_PROFILE_DIR`` setting. Defaults to a ``merlin-profiles``
+    directory in the system temp directory.
+    """
+    return getattr(settings, 'MERLIN_PROFILE_DIR',
+        os.path.join(tempfile.gettempdir(), 'merlin-profiles'))
+
+
+def should_profile(slug):
+    """
+    Returns whether the request for the step ``slug`` is picked to be
+    profiled. The ``MERLIN_PROFILE_RATE`` setting is the share of the
+    requests that are profiled, from 0, the default, to 1. When the
+    ``MERLIN_PROFILE_SLUGS`` setting is defined only the requests for the
+    steps it lists are considered.
+    """
+    rate = getattr(settings, 'MERLIN_PROFILE_RATE', 0)
+
+    if not rate:
+        return False
+
+    slugs = getattr(settings, 'MERLIN_PROFILE_SLUGS', None)
+
+    if slugs is not None and slug not in slugs:
+        return False
+
+    return random.random() < rate
+
+
+def _get_filename(key):
+    name = '--'.join([re.sub(r'[^A-Za-z0-9_.:-]', '_', str(part))
+        for part in key])
+
+    return '%s.%d.prof' % (name, os.getpid())
+
+
+def profile(key, func, *args, **kwargs):
+    """
+    Calls ``func`` under the profiler and returns its result. The profile
+    is added to the ones of the previous calls with the same ``key``, a
+    ``(wizard_id, slug, method)`` tuple, and the total is dumped to a file
+    of the profile directory named after the key and the process id.
+    """
+    profiler = cProfile.Profile()
+
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+
+    finally:
+        directory = get_profile_dir()
+
+        with _lock:
+            if key in _stats:
+                _stats[key].add(profiler)
+
+            else:
+                _stats[key] = pstats.Stats(profiler)
+
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+
+            _stats[key].dump_stats(os.path.join(directory,
+                _get_filename(key)))
@@ -0,0 +1,131 @@
+import threading
+import time
+
+from django.conf import settings
+from django.utils import simplejson
+from django.utils.hashcompat import md5_constructor
+
+
+__all__ = ('anonymize', 'get_shape', 'record',)
+
+
+# Parameters of the ``validate`` slug naming steps and fields, which are kept
+# as they are so the requests can be replayed.
+VALIDATE_PARAMETERS = ('step', 'field', 'schema',)
+
+# Parameters left out of the recording.
+IGNORED_PARAMETERS = ('csrfmiddlewaretoken',)
+
+_lock = threading.Lock()
+_streams = {}
+
+
+def anonymize(value):
+    """
+    Returns a digest of ``value`` salted with the ``SECRET_KEY``, which tells
+    the requests of a session apart without revealing its key.
+    """
+    return md5_constructor('%s%s' % (settings.SECRET_KEY,
+        value)).hexdigest()[:16]
+
+
+def get_shape(data, keep=()):
+    """
+    Returns the shape of the submitted ``data``: the length of the value of
+    every parameter, or the list of lengths of a parameter sent several
+    times. The values of the parameters in ``keep`` are kept instead.
+    """
+    shape = {}
+
+    for name in data:
+        if name in IGNORED_PARAMETERS:
+            continue
+
+        values = data.getlist(name)
+
+        if name in keep:
+            shape[name] = values[0] if len(values) == 1 else values
+
+        elif len(values) == 1:
+            shape[name] = len(values[0])
+
+        else:
+            shape[name] = [len(value) for value in values]
+
+    return shape
+
+
+def _get_client(request):
+    session = getattr(request, 'session', None)
+    key = request.COOKIES.get(settings.SESSION_COOKIE_NAME, None)
+
+    if key is None and session is not None:
+        key = session.session_key
+
+    return key
+
+
+def _write(path, line):
+    with _lock:
+        stream = _streams.get(path, None)
+
+        if stream is None:
+            stream = _streams[path] = open(path, 'a')
+
+        # One write per line, so the lines of several processes appending to
+        # the same file do not mix.
+        stream.write(line)
+        stream.flush()
+
+
+def record(request, wizard_id, slug, response, duration):
+    """
+    Appends the request to the file set in the ``MERLIN_RECORD_FILE``
+    setting, as one line of JSON, when the setting is defined. The line
+    holds the wizard id, the slug, the method, the status of the response,
+    the duration in milliseconds, a digest of the session and the shape of
+    the submitted data, but none of the submitted values.
+
+    .. versionadded:: 0.9
+
+    :param request:
+        The ``HttpRequest`` that was handled.
+
+    :param wizard_id:
+        The id of the wizard that handled it.
+
+    :param slug:
+        The slug of the step, or the reserved slug, that was asked for.
+
+    :param response:
+        The ``HttpResponse`` returned by the wizard.
+
+    :param duration:
+        How long the wizard took, in seconds.
+    """
+    path = getattr(settings, 'MERLIN_RECORD_FILE', None)
+
+    if not path:
+        return
+
+    data = request.POST if request.method == 'POST' else request.GET
+    entry = {
+        'at': round(time.time(), 3),
+        'session': anonymize(_get_client(request)),
+        'wizard': wizard_id,
+        'slug': slug,
+        'method': request.method,
+        'status': response.status_code,
+        'ms': round(1000 * duration, 3),
+        'fields': get_shape(data,
+            VALIDATE_PARAMETERS if slug == 'validate' else ()),
+    }
+
+    if request.FILES:
+        entry['files'] = dict((name, uploaded.size)
+            for name, uploaded in request.FILES.items())
+
+    if getattr(request, '_merlin_invalid', False):
+        entry['invalid'] = True
+
+    _write(path, simplejson.dumps(entry, separators=(',', ':')) + '\n')
@@ -0,0 +1,127 @@
+import decimal
+
+from django import forms
+from django.forms.models import ModelChoiceField
+from django.utils import simplejson
+from django.utils.encoding import force_unicode
+
+
+__all__ = ('get_field_schema', 'get_form_schema', 'get_form_schema_json',)
+
+
+# Checked in order, so every field class comes before the ones it extends.
+FIELD_TYPES = (
+    (forms.EmailField, 'email'),
+    (forms.URLField, 'url'),
+    (forms.IPAddressField, 'ip_address'),
+    (forms.SlugField, 'slug'),
+    (forms.RegexField, 'regex'),
+    (forms.CharField, 'text'),
+    (forms.FloatField, 'float'),
+    (forms.IntegerField, 'integer'),
+    (forms.DecimalField, 'decimal'),
+    (forms.DateTimeField, 'datetime'),
+    (forms.DateField, 'date'),
+    (forms.TimeField, 'time'),
+    (forms.NullBooleanField, 'null_boolean'),
+    (forms.BooleanField, 'boolean'),
+    (forms.MultipleChoiceField, 'multiple_choice'),
+    (forms.ChoiceField, 'choice'),
+    (forms.FileField, 'file'),
+)
+
+# The attributes of the fields copied into the schema when they are set.
+FIELD_ATTRIBUTES = ('max_length', 'min_length', 'max_value', 'min_value',
+    'max_digits', 'decimal_places',)
+
+
+_schemas = {}
+
+
+def _get_value(value):
+    if isinstance(value, decimal.Decimal):
+        return force_unicode(value)
+
+    return value
+
+
+def _get_choices(field):
+    values = []
+
+    for value, label in field.choices:
+        if isinstance(label, (list, tuple)):
+            values.extend(force_unicode(option) for option, label in label)
+
+        else:
+            values.append(force_unicode(value))
+
+    return values
+
+
+def get_field_schema(field):
+    """
+    Returns a ``dict`` describing the checks of the provided form field that
+    a browser can run: its ``type``, whether it is ``required``, the length
+    and value bounds that are set, the ``pattern`` of regex fields and the
+    allowed ``choices``. The choices of model choice fields come from the
+    database, so they are left out.
+    """
+    schema = {'type': None, 'required': field.required}
+
+    for field_class, field_type in FIELD_TYPES:
+        if isinstance(field, field_class):
+            schema['type'] = field_type
+            break
+
+    for name in FIELD_ATTRIBUTES:
+        value = getattr(field, name, None)
+
+        if value is not None:
+            schema[name] = _get_value(value)
+
+    if isinstance(field, forms.RegexField):
+        schema['pattern'] = field.regex.pattern
+
+    if isinstance(field, forms.ChoiceField) and \
+            not isinstance(field, ModelChoiceField):
+        schema['choices'] = _get_choices(field)
+
+    return schema
+
+
+def get_form_schema(form):
+    """
+    Returns the validation schema of the provided form class, a ``dict``
+    with the schema of each of its fields under ``fields``. It is computed
+    once per form class from the declared fields, so fields changed in the
+    ``__init__`` of the form are described as declared.
+
+    .. versionadded:: 0.9
+
+    :param form:
+        The form class to describe.
+    """
+    schema = _schemas.get(form, None)
+
+    if schema is None:
+        schema = {'fields': dict((name, get_field_schema(field))
+            for name, field in form.base_fields.items())}
+        _schemas[form] = schema
+
+    return schema
+
+
+def get_form_schema_json(form):
+    """
+    Returns the validation schema of the provided form class as compact
+    JSON, safe to include in a ``<script>`` element.
+
+    .. versionadded:: 0.9
+
+    :param form:
+        The form class to describe.
+    """
+    content = simplejson.dumps(get_form_schema(form), separators=(',', ':'))
+
+    return content.replace('<', '\\u003c').replace('>', '\\u003e') \
+        .replace('&', '\\u0026')
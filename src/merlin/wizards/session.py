@@ -1,23 +1,84 @@
+import cPickle as pickle
+import logging
+import os
+import warnings
+import weakref
 from functools import wraps
-
+from timeit import default_timer
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.urlresolvers import NoReverseMatch, Resolver404, resolve, \
+    reverse
+from django.forms.fields import FileField
+from django.forms.forms import NON_FIELD_ERRORS
+from django.forms.widgets import Media
 from django.http import *
-from django.shortcuts import render_to_response
+from django.template import Context, loader
 from django.template.context import RequestContext
-from merlin.wizards import MissingStepException, MissingSlugException
-
+from django.utils import simplejson
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.encoding import force_unicode
+from django.utils.hashcompat import md5_constructor
+from django.utils.http import parse_etags, quote_etag
+from django.utils.safestring import mark_safe
+from merlin.wizards import (MissingStepException, MissingSlugException,
+    StateSizeException)
+from merlin.wizards import analytics, prefetch, profiling, recording
+
+from merlin.wizards.blobs import *
+from merlin.wizards.files import *
+from merlin.wizards.schema import get_form_schema, get_form_schema_json
+from merlin.wizards.metrics import (gauge, get_metrics_sink,
+    get_pickled_size, timed)
+from merlin.wizards.stores import get_state_store
+from merlin.wizards.summary import get_display_fields, map_steps, \
+    summarize_step
 from merlin.wizards.utils import *
+from merlin.wizards.utils import UnitOfWork
 
 
-def modifies_session(func):
+def modifies_state(func):
     @wraps(func)
     def wrapper(self, request, *args, **kwargs):
         result = func(self, request, *args, **kwargs)
-        request.session.modified = True
+        self._get_work(request).dirty = True
 
         return result
     return wrapper
 
 
+def modifies_session(func):
+    """
+    Deprecated name of ``modifies_state``, kept for existing subclasses.
+    """
+    warnings.warn("modifies_session is deprecated, use modifies_state "
+        "instead.", DeprecationWarning, stacklevel=2)
+
+    return modifies_state(func)
+
+
+# Every wizard instance by id, used to clear the state of the wizards evicted
+# from a session.
+_wizards = weakref.WeakValueDictionary()
+
+# The state store of every wizard id, kept after the instance is gone so the
+# state of a wizard evicted from a session can still be removed.
+_stores = {}
+
+# The session key of the list of wizard ids used by a session, least recently
+# used first.
+WIZARDS_SESSION_KEY = 'merlin.wizards'
+
+logger = logging.getLogger('merlin.wizards')
+
+# Reversed in place of the step slug to find the base URL of a wizard.
+SLUG_PLACEHOLDER = '__merlin_slug__'
+
+# The request header asking for the form of a step without the page around it.
+FRAGMENT_HEADER = 'HTTP_X_MERLIN_FRAGMENT'
+
+
 class SessionWizard(object):
     """
     This class allows for the ability to chop up a long form into sizable steps
@@ -33,8 +94,23 @@ class SessionWizard(object):
         Provides a list of :class:`Step` objects in the order in
         which the wizard should display them to the user. This list can
         be manipulated to add or remove steps as needed.
+
+    :param store:
+        The state store used to keep the :class:`WizardState` between
+        requests. Defaults to an instance of the class set in the
+        ``MERLIN_STATE_STORE`` setting, which is the
+        :class:`~merlin.wizards.stores.SessionStateStore` unless changed.
+
+    :param namespace:
+        Keeps the state of this instance apart from other instances of the
+        same class. Give every instance mounted in the urlconf its own
+        namespace, the state of instances without one is shared.
     """
-    def __init__(self, steps):
+    #: The error shown on a step whose data would make the wizard state larger
+    #: than the ``MERLIN_STATE_SIZE_LIMIT`` setting allows.
+    state_size_error = 'This step holds too much data, please shorten it.'
+
+    def __init__(self, steps, store=None, namespace=None):
         if not isinstance(steps, list):
             raise TypeError('steps must be an instance of or subclass of list')
 
@@ -52,16 +128,248 @@ class SessionWizard(object):
         clazz = self.__class__
 
         self.id = '%s.%s' % (clazz.__module__, clazz.__name__,)
+
+        if namespace:
+            self.id = '%s:%s' % (self.id, namespace,)
+
         self.base_steps = steps
+        self.store = store or get_state_store()
+        self.slug_index = dict((step.slug, index)
+            for index, step in enumerate(steps))
+        self.extra_steps = []
+        self._step_info = {}
+        self._templates = {}
+        self._media = None
+
+        if _wizards.get(self.id, None) is not None:
+            warnings.warn("Another instance of %s is already in use, both "
+                "share the same state. Give each instance its own namespace."
+                % self.id, RuntimeWarning, stacklevel=2)
+
+        _wizards[self.id] = self
+        _stores[self.id] = self.store
+
+    def compile(self):
+        """
+        Does once the work that would otherwise be done on the first request
+        for each step: calls :meth:`prepare_step` on every base and
+        registered step, renders the templates returned by
+        :meth:`get_template` for an unbound form once and combines the media
+        of the forms. The ``merlin_warmup`` management command calls this on
+        every wizard of the urlconf.
+
+        .. versionadded:: 0.9
+        """
+        request = self.get_warmup_request()
+
+        for step in self.base_steps + self.extra_steps:
+            try:
+                self.prepare_step(step)
+                form = step.form()
+                template = self._get_template(self.get_template(request, step,
+                    form))
+
+                # Renders the form once so the template tags, widgets and
+                # translations it uses are loaded before the first request.
+                template.render(Context({
+                    'current_step': step,
+                    'form': form,
+                    'url_base': '',
+                    'extra_context': {},
+                    'csrf_token': 'NOTPROVIDED',
+                }))
+
+            except Exception:
+                logger.warning("Unable to compile step %s of %s.", step.slug,
+                    self.id, exc_info=True)
+
+        self.get_media()
+
+        return self
+
+    def register_step(self, step):
+        """
+        Registers a :class:`Step` that is not one of the base steps but may
+        be inserted while the wizard runs, so it is compiled and its form
+        media is part of :meth:`get_media`. Returns the step.
+
+        .. versionadded:: 0.9
+
+        :param step:
+            The :class:`Step` that may be inserted.
+        """
+        if not isinstance(step, Step):
+            raise TypeError('All steps must be an instance of Step')
+
+        self.extra_steps.append(step)
+        self._media = None
+
+        return step
+
+    def get_media(self):
+        """
+        Returns the ``Media`` of the forms of all the base steps and the
+        steps registered with :meth:`register_step`, without duplicates. It
+        is combined once per wizard, so a page can load the assets of every
+        step up front.
+
+        .. versionadded:: 0.9
+        """
+        media = self._media
+
+        if media is None:
+            media = Media()
+
+            for step in self.base_steps + self.extra_steps:
+                media = media + self.get_step_info(step)['media']
+
+            self._media = media
+
+        return media
+
+    def get_step_info(self, step):
+        """
+        Returns a ``dict`` of metadata about the :class:`Step`, computed once
+        per process: its ``index`` in the base steps (``None`` for steps
+        added while the wizard runs), the names of the form ``fields``, the
+        form ``media`` and its validation ``schema`` as JSON.
+
+        .. versionadded:: 0.9
+
+        :param step:
+            The :class:`Step` to describe.
+        """
+        key = (step.slug, step.form)
+        info = self._step_info.get(key, None)
+
+        if info is None:
+            index = self.slug_index.get(step.slug, None)
+
+            if index is not None and \
+                    self.base_steps[index].form is not step.form:
+                index = None
+
+            info = self._step_info[key] = {
+                'index': index,
+                'fields': tuple(step.form.base_fields.keys()),
+                'media': step.form().media,
+                'schema': mark_safe(get_form_schema_json(step.form)),
+            }
+
+        return info
+
+    def get_warmup_request(self):
+        """
+        Returns the ``HttpRequest`` passed to :meth:`get_template` when
+        there is no request from a user: by :meth:`compile` and
+        :meth:`prepare_step`. It is a bare GET request for the root URL,
+        without a session or a user.
+
+        .. versionadded:: 0.9
+        """
+        request = HttpRequest()
+        request.method = 'GET'
+        request.path = request.path_info = '/'
+        request.META.update({'SERVER_NAME': 'localhost', 'SERVER_PORT': '80'})
+
+        return request
+
+    def _get_template(self, template_name):
+        """
+        Returns the compiled template, loaded once per process unless
+        ``TEMPLATE_DEBUG`` is on, so changes to the templates show up during
+        development. A list or tuple of names gives the first template that
+        exists.
+        """
+        if isinstance(template_name, (list, tuple)):
+            load = loader.select_template
+
+        else:
+            load = loader.get_template
+
+        if settings.TEMPLATE_DEBUG:
+            return load(template_name)
+
+        key = self._get_template_key(template_name)
+        template = self._templates.get(key, None)
+
+        if template is None:
+            template = self._templates[key] = load(template_name)
+
+        return template
+
+    def _get_template_key(self, template_name):
+        """
+        Returns the key the template is cached under in ``_templates``.
+        """
+        if isinstance(template_name, (list, tuple)):
+            return tuple(template_name)
+
+        return template_name
 
     def __call__(self, request, *args, **kwargs):
         """
         Initialize the step list for the session if needed and call the proper
-        HTTP method handler.
+        HTTP method handler. The changes made to the wizard state while
+        handling the request are saved once the response is ready, or dropped
+        if an exception is raised.
+
+        A share of the requests set by the ``MERLIN_PROFILE_RATE`` setting
+        is run under the profiler.
         """
-        self._init_wizard(request)
+        slug = kwargs.get('slug', None)
+
+        if profiling.should_profile(slug):
+            return profiling.profile((self.id, slug, request.method),
+                self._handle, request, *args, **kwargs)
+
+        return self._handle(request, *args, **kwargs)
 
+    def _handle(self, request, *args, **kwargs):
+        """
+        Handles the request and saves the changes made to the wizard state.
+        The request is recorded when the ``MERLIN_RECORD_FILE`` setting is
+        set.
+        """
         slug = kwargs.get('slug', None)
+        start = default_timer()
+
+        with self._timed(request, 'request', slug):
+            try:
+                response = self._dispatch(request, *args, **kwargs)
+
+            except:
+                for work in self._get_works(request).values():
+                    work.rollback()
+
+                self._get_works(request).clear()
+                raise
+
+            with self._timed(request, 'save', slug):
+                for work in self._get_works(request).values():
+                    work.commit(request)
+
+                self.store.process_response(request, self.id, response)
+
+        recording.record(request, self.id, slug, response,
+            default_timer() - start)
+
+        return response
+
+    def _dispatch(self, request, *args, **kwargs):
+        """
+        Calls the HTTP method handler for the requested step.
+        """
+        slug = kwargs.get('slug', None)
+
+        with self._timed(request, 'load', slug):
+            self._get_work(request)
+
+        if slug == 'validate' and slug not in self.slug_index:
+            return self._validate(request)
+
+        with self._timed(request, 'initialize', slug):
+            self._init_wizard(request)
 
         if not slug:
             raise MissingSlugException("Slug not found.")
@@ -69,19 +377,72 @@ class SessionWizard(object):
         step = self.get_step(request, slug)
 
         if not step:
-            if slug == 'cancel':
-                self.cancel(request)
-                redirect = request.REQUEST.get('rd', '/')
+            if slug != 'cancel':
+                raise MissingStepException("Step for slug %s not found." % slug)
 
-                return HttpResponseRedirect(redirect)
+            cancelled = self._get_cancelled_slug(request)
+            self.cancel(request)
+            analytics.record(self.id, cancelled, 'cancel')
+            redirect = request.REQUEST.get('rd', '/')
 
-            raise MissingStepException("Step for slug %s not found." % slug)
+            return HttpResponseRedirect(redirect)
 
         method_name = 'process_%s' % request.method
         method = getattr(self, method_name)
 
         return method(request, step)
 
+    def _get_cancelled_slug(self, request):
+        """
+        Returns the slug of the step the user left the wizard on, counted
+        for a cancel without writing the state: the ``step`` parameter of
+        the cancel link when it names a step of the wizard, otherwise the
+        first step without data, or the last step when they all have some.
+        """
+        state = self._get_state(request)
+        slugs = [step.slug for step in state.steps]
+        slug = request.REQUEST.get('step', None)
+
+        if slug in slugs:
+            return slug
+
+        for slug in slugs:
+            if not state.form_data.get(slug, None):
+                return slug
+
+        return slugs[-1]
+
+    def _validate(self, request):
+        """
+        Answers a request to the ``validate`` slug with the errors of the
+        fields it names, or the validation schema of the step when it has a
+        ``schema`` parameter, as JSON. The wizard state is only read, so
+        nothing is written and a wizard that was never started stays that way.
+        """
+        data = request.POST if request.method == 'POST' else request.GET
+        slug = data.get('step', None)
+        state = self._get_state(request)
+        steps = state.steps if state is not None else self.base_steps
+        step = None
+
+        for candidate in steps:
+            if candidate.slug == slug:
+                step = candidate
+                break
+
+        if step is None:
+            raise MissingStepException("Step for slug %s not found." % slug)
+
+        if 'schema' in data:
+            content = {'schema': get_form_schema(step.form)}
+
+        else:
+            with self._timed(request, 'validate', slug):
+                content = {'errors': self.validate_fields(request, step, data,
+                    data.getlist('field') or None)}
+
+        return HttpResponse(simplejson.dumps(content, separators=(',', ':')),
+            mimetype='application/json')
 
     def _init_wizard(self, request):
         """
@@ -90,42 +451,152 @@ class SessionWizard(object):
         make sure each session has its own copy of the step list to manipulate.
         This way multiple connections will not trample on each others steps.
         """
-        if self.id not in request.session:
-            request.session[self.id] = WizardState(
+        if self.store.uses_session:
+            self._touch(request)
+
+        state = self._get_state(request)
+
+        if state is None:
+            state = WizardState(
                 steps=self.base_steps[:], # Copies the list
                 current_step=self.base_steps[0],
                 form_data={})
+            work = self._get_work(request)
+            work.state = state
+            work.dirty = True
+            self.initialize(request, state)
+
+        else:
+            self.initialize(request, state)
+
+    def _touch(self, request):
+        """
+        Marks this wizard as the most recently used one of the session. When
+        the session uses more wizards than the ``MERLIN_MAX_WIZARDS`` setting
+        allows, the least recently used ones are cleared.
+        """
+        wizard_ids = request.session.get(WIZARDS_SESSION_KEY, [])
 
-        self.initialize(request, request.session[self.id])
+        if wizard_ids and wizard_ids[-1] == self.id:
+            return
+
+        wizard_ids = [wizard_id for wizard_id in wizard_ids
+            if wizard_id != self.id] + [self.id]
+        limit = getattr(settings, 'MERLIN_MAX_WIZARDS', None)
+
+        if limit is not None:
+            for wizard_id in wizard_ids[:-limit]:
+                self._evict(request, wizard_id)
+
+            wizard_ids = wizard_ids[-limit:]
+
+        request.session[WIZARDS_SESSION_KEY] = wizard_ids
+
+    def _evict(self, request, wizard_id):
+        """
+        Clears the state of the wizard ``wizard_id`` from its state store,
+        with its uploaded files and blobs, when this request is committed.
+        The store of a wizard whose instance is gone is the one it was
+        created with, or the ``MERLIN_STATE_STORE`` one if it is unknown.
+        """
+        wizard = _wizards.get(wizard_id, None)
+
+        if wizard is not None:
+            wizard.clear(request)
+
+            return
+
+        works = self._get_works(request)
+
+        if wizard_id not in works:
+            store = _stores.get(wizard_id, None) or get_state_store()
+            works[wizard_id] = UnitOfWork(store, wizard_id,
+                store.load(request, wizard_id))
+
+        self._clear_work(works[wizard_id])
+
+    def _clear_work(self, work):
+        """
+        Marks the state of the :class:`UnitOfWork` as deleted and deletes
+        the files and blobs it references once the work is committed.
+        """
+        if work.state is not None:
+            for data in (work.state.form_data or {}).values():
+                work.on_commit(delete_stored_files, data)
+                work.on_commit(delete_blobs, data)
+
+            work.state = None
+            work.deleted = True
+
+    def _timed(self, request, phase, slug):
+        """
+        Returns a context manager that reports how long the ``phase`` of the
+        request took to the metrics sink, if one is configured.
+        """
+        return timed(phase, self.id, slug, request.method)
+
+    def _get_works(self, request):
+        """
+        Returns the ``dict`` of the :class:`UnitOfWork` objects of the wizards
+        used during this request.
+        """
+        if not hasattr(request, '_merlin_works'):
+            request._merlin_works = {}
+
+        return request._merlin_works
+
+    def _get_work(self, request):
+        """
+        Returns the :class:`UnitOfWork` of this wizard for the request. The
+        state is loaded from the state store once per request.
+        """
+        works = self._get_works(request)
+
+        if self.id not in works:
+            works[self.id] = UnitOfWork(self.store, self.id,
+                self.store.load(request, self.id))
+
+        return works[self.id]
 
     def _get_state(self, request):
         """
         Returns the :class:`WizardState` object used to manage this
         wizards internal state.
         """
-        return request.session[self.id]
+        return self._get_work(request).state
 
     def _show_form(self, request, step, form):
         """
         Render the provided form for the provided step to the
         response stream.
         """
-        context = self.process_show_form(request, step, form)
-
-        return self.render_form(request, step, form, {
-            'current_step': step,
-            'form': form,
-            'previous_step': self.get_before(request, step),
-            'next_step': self.get_after(request, step),
-            'url_base': self._get_URL_base(request, step),
-            'extra_context': context
-        })
-
+        with self._timed(request, 'render_form', step.slug):
+            context = self.process_show_form(request, step, form)
+            navigation = self.get_navigation(request, step)
+            info = self.get_step_info(step)
+
+            return self.render_form(request, step, form, {
+                'current_step': step,
+                'form': form,
+                'previous_step': navigation.previous,
+                'next_step': navigation.next,
+                'url_base': navigation.url_base,
+                'navigation': navigation,
+                'state_field': self.store.get_form_field(request, self.id),
+                'validation_schema': info['schema'],
+                'step_media': info['media'],
+                'wizard_media': self.get_media(),
+                'summary': self.get_summary(request, step)
+                    if isinstance(step, SummaryStep) else None,
+                'extra_context': context
+            })
+
+    @modifies_state
     def _set_current_step(self, request, step):
         """
         Sets the currenlty executing step.
         """
-        self._get_state(request).current_step = step
+        self._get_state(request).set_current_step(step)
 
         return step
 
@@ -133,23 +604,299 @@ class SessionWizard(object):
         """
         Returns the base URL of the wizard.
         """
-        index = request.path.rfind(step.slug)
+        return self._get_URL_parts(request, step)[0]
+
+    def _get_URL(self, request, current_step, step):
+        """
+        Returns the URL of ``step`` from the request for ``current_step``.
+        """
+        url_base, url_suffix = self._get_URL_parts(request, current_step)
+
+        return url_base + step.slug + url_suffix
+
+    def _get_URL_parts(self, request, step):
+        """
+        Returns the parts of the URL of the wizard before and after the step
+        slug, found once per request by reversing the url the request
+        resolved to with a placeholder in place of the slug. When the url
+        can not be reversed, the slug is cut from the end of the path.
+        """
+        if not hasattr(request, '_merlin_url_parts'):
+            request._merlin_url_parts = {}
+
+        parts = request._merlin_url_parts.get(self.id, None)
+
+        if parts is None:
+            try:
+                match = resolve(request.path_info)
+                kwargs = dict(match.kwargs, slug=SLUG_PLACEHOLDER)
+
+                if match.url_name:
+                    view = ':'.join([part for part in
+                        (match.namespace, match.url_name) if part])
+
+                else:
+                    view = match.func
+
+                url = reverse(view, args=match.args, kwargs=kwargs)
+                index = url.rindex(SLUG_PLACEHOLDER)
+                parts = (url[:index], url[index + len(SLUG_PLACEHOLDER):])
+
+            except (Resolver404, NoReverseMatch, ValueError):
+                if request.path.endswith(step.slug):
+                    parts = (request.path[:-len(step.slug)], '')
+
+                else:
+                    parts = (request.path[:request.path.rfind(step.slug)], '')
 
-        return request.path[:index]
+            request._merlin_url_parts[self.id] = parts
+
+        return parts
+
+    def get_navigation(self, request, step):
+        """
+        Returns the :class:`~merlin.wizards.utils.Navigation` of the
+        provided :class:`Step`.
+
+        .. versionadded:: 0.9
+
+        :param request:
+            A ``HttpRequest`` object that carries along with it the session
+            used to access the wizard state.
+
+        :param step:
+            The :class:`Step` being shown.
+        """
+        state = self._get_state(request)
+        url_base, url_suffix = self._get_URL_parts(request, step)
+
+        return Navigation(state.steps, step, url_base, state.form_data,
+            url_suffix)
 
     def process_GET(self, request, step):
         """
-        Renders the ``Form`` for the requested :class:`Step`
+        Renders the ``Form`` for the requested :class:`Step`. When the
+        ``MERLIN_ETAGS`` setting is on, the response carries an ETag and a
+        request whose ``If-None-Match`` header matches it is answered with a
+        304 before the form is built.
         """
+        work = self._get_work(request)
+
+        if not prefetch.is_prefetch(request):
+            analytics.record(self.id, step.slug, 'view')
+
+            if work.state.form_data.get(step.slug, None):
+                analytics.record(self.id, step.slug, 'back')
+
+        etag = None
+
+        # A request that changed the state can not reuse an earlier page.
+        if getattr(settings, 'MERLIN_ETAGS', False) and not work.dirty:
+            etag = self.get_etag(request, step)
+
+            if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+                response = HttpResponseNotModified()
+                response['ETag'] = quote_etag(etag)
+
+                return response
+
         form_data = self.get_cleaned_data(request, step)
 
         if form_data:
-            form = step.form(form_data)
+            form = step.form(form_data, get_stored_files(form_data))
 
         else:
-            form = step.form()
+            form = step.form(initial=self.get_initial(request, step))
+
+        response = self._show_form(request, step, form)
+
+        if etag is not None and not work.dirty:
+            response['ETag'] = quote_etag(etag)
+            patch_cache_control(response, private=True, no_cache=True)
 
-        return self._show_form(request, step, form)
+        next_step = self.get_after(request, step)
+
+        if next_step is not None:
+            prefetch.schedule((self.id, next_step.slug, next_step.form),
+                self.prepare_step, next_step)
+
+            if getattr(settings, 'MERLIN_PREFETCH_LINKS', False):
+                response['Link'] = '<%s>; rel=prefetch' % self._get_URL(
+                    request, step, next_step)
+
+        return response
+
+    def _complete_resolvable(self, request, step):
+        """
+        Goes through the steps from ``step`` on and completes the ones that
+        can be completed without the user, storing the valid initial data of
+        each as if it had been posted. Steps that already hold data are
+        skipped as they are. Returns the first step that needs the user, or
+        ``None`` when there is none left. All of it is written with the rest
+        of the request, at once.
+        """
+        while step is not None:
+            data = self.get_initial(request, step)
+
+            if not self.is_resolvable(request, step, data):
+                return step
+
+            if not self._get_state(request).form_data.get(step.slug, None):
+                form = step.form(data or {})
+
+                if not form.is_valid():
+                    return step
+
+                try:
+                    self.set_cleaned_data(request, step, form.cleaned_data)
+
+                except StateSizeException:
+                    return step
+
+                analytics.record(self.id, step.slug, 'skipped')
+
+                with self._timed(request, 'process_step', step.slug):
+                    self.process_step(request, step, form)
+
+            step = self.get_after(request, step)
+
+        return None
+
+    def get_initial(self, request, step):
+        """
+        Returns the initial data of the form of the provided :class:`Step`,
+        from the ``initial`` function of the step by default, or ``None``.
+        It is used to prefill the form and to complete resolvable steps.
+
+        .. versionadded:: 0.9
+
+        :param request:
+            A ``HttpRequest`` object that carries along with it the session
+            used to access the wizard state.
+
+        :param step:
+            The :class:`Step` whose initial data is needed.
+        """
+        if step.initial is not None:
+            return step.initial(request, self)
+
+        return None
+
+    def is_resolvable(self, request, step, data):
+        """
+        Returns whether the provided :class:`Step` can be completed with its
+        initial ``data`` without showing it to the user, from the
+        ``resolvable`` argument of the step by default. The step is only
+        skipped when the data is also valid.
+
+        .. versionadded:: 0.9
+
+        :param request:
+            A ``HttpRequest`` object that carries along with it the session
+            used to access the wizard state.
+
+        :param step:
+            The :class:`Step` to check.
+
+        :param data:
+            The initial data returned by :meth:`get_initial`.
+        """
+        if callable(step.resolvable):
+            return step.resolvable(request, self, data)
+
+        return bool(step.resolvable)
+
+    def validate_fields(self, request, step, data, names=None):
+        """
+        Cleans only the named fields of the form of the provided
+        :class:`Step` and returns their errors as a ``dict`` of lists of
+        messages, empty when they are valid. The ``clean_<field>`` methods of
+        the form are run, its ``clean`` method is not, since it may need the
+        fields that were left out.
+
+        .. versionadded:: 0.9
+
+        :param request:
+            A ``HttpRequest`` object that carries along with it the session
+            used to access the wizard state.
+
+        :param step:
+            The :class:`Step` whose form holds the fields.
+
+        :param data:
+            The submitted data, as for binding the form.
+
+        :param names:
+            The names of the fields to clean. Defaults to the fields found in
+            ``data``.
+        """
+        form = step.form(data, request.FILES)
+        form.cleaned_data = {}
+        errors = {}
+
+        if names is None:
+            names = [name for name in form.fields
+                if form.add_prefix(name) in data]
+
+        for name in names:
+            field = form.fields.get(name, None)
+
+            if field is None:
+                continue
+
+            value = field.widget.value_from_datadict(form.data, form.files,
+                form.add_prefix(name))
+
+            try:
+                if isinstance(field, FileField):
+                    value = field.clean(value,
+                        form.initial.get(name, field.initial))
+
+                else:
+                    value = field.clean(value)
+
+                form.cleaned_data[name] = value
+
+                if hasattr(form, 'clean_%s' % name):
+                    form.cleaned_data[name] = getattr(form,
+                        'clean_%s' % name)()
+
+            except ValidationError, e:
+                errors[name] = [force_unicode(message)
+                    for message in e.messages]
+
+        return errors
+
+    def get_etag(self, request, step):
+        """
+        Returns the ETag of the page of the provided :class:`Step`. It is
+        made of the wizard id, the state version, the step slug and form,
+        whether a fragment is asked for, the cleaned data stored for the step
+        and the ``MERLIN_TEMPLATE_VERSION``
+        setting, which should change whenever the templates do. Override it
+        to add anything else your pages depend on.
+
+        .. versionadded:: 0.9
+
+        :param request:
+            A ``HttpRequest`` object that carries along with it the session
+            used to access the wizard state.
+
+        :param step:
+            The :class:`Step` being shown.
+        """
+        state = self._get_state(request)
+        digest = md5_constructor()
+
+        for part in (self.id, state.version, step.slug, step.form.__module__,
+                step.form.__name__, self.is_fragment(request),
+                getattr(settings, 'MERLIN_TEMPLATE_VERSION', '')):
+            digest.update('%s\0' % part)
+
+        digest.update(pickle.dumps(state.form_data.get(step.slug, None),
+            pickle.HIGHEST_PROTOCOL))
+
+        return digest.hexdigest()
 
     def process_POST(self, request, step):
         """
@@ -157,22 +904,84 @@ class SessionWizard(object):
         next :class:`Step` in the sequence or finished the wizard process
         by calling ``self.done``
         """
-        form = step.form(request.POST)
+        previous = self._get_state(request).form_data.get(step.slug, None)
+        stored_files = get_stored_files(previous)
+
+        if stored_files:
+            # Previously uploaded files become the initial value of their
+            # fields so the user does not have to upload them again.
+            form = step.form(request.POST, request.FILES, initial=stored_files)
+
+        else:
+            form = step.form(request.POST, request.FILES)
+
+        with self._timed(request, 'is_valid', step.slug):
+            is_valid = form.is_valid()
+
+        if not is_valid:
+            analytics.record(self.id, step.slug, 'invalid')
+            request._merlin_invalid = True
 
-        if not form.is_valid():
             return self._show_form(request, step, form)
 
-        self.set_cleaned_data(request, step, form.cleaned_data)
-        self.process_step(request, step, form)
-        next_step = self.get_after(request, step)
+        try:
+            self.set_cleaned_data(request, step, form.cleaned_data)
 
-        if next_step:
-            url_base = self._get_URL_base(request, step)
+        except StateSizeException:
+            form._errors.setdefault(NON_FIELD_ERRORS,
+                form.error_class()).append(self.state_size_error)
+
+            return self._show_form(request, step, form)
+
+        analytics.record(self.id, step.slug, 'valid')
 
-            return HttpResponseRedirect(urljoin(url_base, next_step.slug))
+        with self._timed(request, 'process_step', step.slug):
+            self.process_step(request, step, form)
+
+        next_step = self._complete_resolvable(request,
+            self.get_after(request, step))
+
+        if next_step:
+            return HttpResponseRedirect(self._get_URL(request, step, next_step))
 
         else:
-            return self.done(request)
+            with self._timed(request, 'done', step.slug):
+                response = self.done(request)
+
+            analytics.record(self.id, step.slug, 'done')
+
+            return response
+
+    def get_summary(self, request, current_step):
+        """
+        Returns the answers given to the completed steps of the wizard, in
+        order, as shown by a :class:`SummaryStep`. Each item is the ``dict``
+        returned by :func:`~merlin.wizards.summary.summarize_step` with the
+        ``url`` of the step added, so the user can go back and change it.
+        The forms are not built, and the values of the steps are looked up
+        at the same time when the ``MERLIN_SUMMARY_WORKERS`` setting is set.
+
+        .. versionadded:: 0.9
+
+        :param request:
+            A ``HttpRequest`` object that carries along with it the session
+            used to access the wizard state.
+
+        :param current_step:
+            The :class:`Step` being shown, which the URLs are relative to.
+        """
+        state = self._get_state(request)
+        steps = [step for step in state.steps
+            if not isinstance(step, SummaryStep) and
+                state.form_data.get(step.slug, None) is not None]
+        sections = map_steps(lambda step: summarize_step(step,
+            self.get_cleaned_data(request, step)), steps)
+
+        for section in sections:
+            section['url'] = self._get_URL(request, current_step,
+                section['step'])
+
+        return sections
 
     def get_steps(self, request):
         """
@@ -196,13 +1005,11 @@ class SessionWizard(object):
             The unique identifier for a particular :class:`Step` in the
             sequence.
         """
-        steps = self.get_steps(request)
-
-        try:
-            return [step for step in steps if step.slug == slug][0]
+        for step in self.get_steps(request):
+            if step.slug == slug:
+                return step
 
-        except IndexError:
-            return None
+        return None
 
     def get_before(self, request, step):
         """
@@ -250,7 +1057,7 @@ class SessionWizard(object):
         except IndexError:
             return None
 
-    @modifies_session
+    @modifies_state
     def remove_step(self, request, step):
         """
         Removes step from the wizard sequence.
@@ -262,12 +1069,9 @@ class SessionWizard(object):
         :param step:
             The :class:`Step` to remove.
         """
-        steps = self.get_steps(request)
-
-        if step in steps:
-            steps.remove(step)
+        self._get_state(request).remove_step(step)
 
-    @modifies_session
+    @modifies_state
     def insert_before(self, request, current_step, step):
         """
         Inserts a new step into the wizard sequence before the provided step.
@@ -282,13 +1086,9 @@ class SessionWizard(object):
         :param step:
             The new :class:`Step` to insert.
         """
-        steps = self.get_steps(request)
+        self._get_state(request).insert_before(current_step, step)
 
-        if step not in steps:
-            index = steps.index(current_step)
-            steps.insert(index, step)
-
-    @modifies_session
+    @modifies_state
     def insert_after(self, request, current_step, step):
         """
         Inserts a new step into the wizard sequence after the provided step.
@@ -303,11 +1103,7 @@ class SessionWizard(object):
         :param step:
             The new :class:`Step` to insert.
         """
-        steps = self.get_steps(request)
-
-        if step not in steps:
-            index = steps.index(current_step) + 1
-            steps.insert(index, step)
+        self._get_state(request).insert_after(current_step, step)
 
     def get_cleaned_data(self, request, step):
         """
@@ -320,9 +1116,10 @@ class SessionWizard(object):
         :param step:
             The :class:`Step` to use to pull the cleaned form data.
         """
-        return self._get_state(request).form_data.get(step.slug, None)
+        return load_values(
+            self._get_state(request).form_data.get(step.slug, None))
 
-    @modifies_session
+    @modifies_state
     def set_cleaned_data(self, request, step, data):
         """
         Sets the cleaned form data for the provided step.
@@ -335,9 +1132,68 @@ class SessionWizard(object):
             The :class:`Step` to use to store the cleaned form data.
 
         :param data:
-            The cleaned ``Form`` data to store.
+            The cleaned ``Form`` data to store. Any uploaded files are moved
+            to the temporary file storage and only a :class:`StoredFile`
+            reference to them is kept in the wizard state. Values larger than
+            the ``MERLIN_BLOB_THRESHOLD`` setting are moved to the blob store
+            the same way.
+
+        Raises a ``StateSizeException`` without changing the state when the
+        data would make the state larger than ``MERLIN_STATE_SIZE_LIMIT``.
+        """
+        work = self._get_work(request)
+        previous = work.state.form_data.get(step.slug, None)
+        data = offload_values(store_files(data))
+
+        try:
+            self._check_state_size(request, step, data)
+
+        except StateSizeException:
+            delete_stored_files(data, previous)
+            delete_blobs(data, previous)
+            raise
+
+        work.state.set_cleaned_data(step.slug, data)
+
+        # Whichever version of the data is not kept in the end is removed
+        # from the file storage and the blob store.
+        work.on_commit(delete_stored_files, previous, data)
+        work.on_commit(delete_blobs, previous, data)
+        work.on_rollback(delete_stored_files, data, previous)
+        work.on_rollback(delete_blobs, data, previous)
+
+    def _check_state_size(self, request, step, data):
+        """
+        Measures the pickled size of the wizard state and of the step data
+        as they would be once ``data`` is stored for the step. The sizes are
+        sent to the metrics sink, a warning is logged above the
+        ``MERLIN_STATE_SIZE_WARNING`` setting and a ``StateSizeException`` is
+        raised above the ``MERLIN_STATE_SIZE_LIMIT`` setting. Nothing is
+        measured when none of them is set.
         """
-        self._get_state(request).form_data[step.slug] = data
+        warning = getattr(settings, 'MERLIN_STATE_SIZE_WARNING', None)
+        limit = getattr(settings, 'MERLIN_STATE_SIZE_LIMIT', None)
+
+        if warning is None and limit is None and get_metrics_sink() is None:
+            return
+
+        state = self._get_state(request).copy()
+        state.form_data[step.slug] = data
+        state_size = get_pickled_size(state)
+        step_size = get_pickled_size(data)
+
+        gauge('state_size', state_size, self.id, step.slug, request.method)
+        gauge('step_size', step_size, self.id, step.slug, request.method)
+
+        if limit is not None and state_size > limit:
+            raise StateSizeException("The state of %s would be %d bytes, "
+                "%d of them for step %s, which is over the limit of %d bytes."
+                % (self.id, state_size, step_size, step.slug, limit))
+
+        if warning is not None and state_size > warning:
+            logger.warning("The state of %s is %d bytes, %d of them for step "
+                "%s, which is over the warning size of %d bytes.", self.id,
+                state_size, step_size, step.slug, warning)
 
     def get_form_data(self, request):
         """
@@ -345,19 +1201,33 @@ class SessionWizard(object):
         session.  This will mainly be used in the done to query for the form_data
         that has been saved throughout the wizard process.
 
+        Values that were moved to the blob store are loaded when this is
+        called.
+
         :param request:
             A ``HttpRequest`` object that carries along with it the session
             used to access the wizard state.
         """
-        return request.session[self.id]['form_data']
+        form_data = self._get_state(request).form_data
+
+        return dict((slug, load_values(data))
+            for slug, data in form_data.items())
 
     def clear(self, request):
         """
         Removes the internal wizard state from the session. This should be
         called right be for the return from a successful
-        :meth:`~SessionWizard.done()` call.
+        :meth:`~SessionWizard.done()` call. Any uploaded files still in the
+        temporary file storage and any values in the blob store are deleted
+        as well, so move the files that need to be kept before calling this.
         """
-        del request.session[self.id]
+        self._clear_work(self._get_work(request))
+
+        wizard_ids = request.session.get(WIZARDS_SESSION_KEY, [])
+
+        if self.id in wizard_ids:
+            wizard_ids.remove(self.id)
+            request.session.modified = True
 
     # METHODS SUBCLASSES MIGHT OVERRIDE IF APPROPRIATE ########################
     def initialize(self, request, wizard_state):
@@ -390,6 +1260,36 @@ class SessionWizard(object):
         """
         self.clear(request)
 
+    def prepare_step(self, step):
+        """
+        Hook called in a background thread, while the user fills in the step
+        before ``step``, when the ``MERLIN_PREFETCH_WORKERS`` setting is set.
+        By default it computes the step metadata and the labels shown by a
+        :class:`SummaryStep`, compiles the template and renders the unbound
+        form once. Override it to also warm the caches the form of the step
+        reads its choices from, and call the parent. There is no request
+        here, and nothing done by this hook should be specific to a user.
+        Once the metadata and the template of the step are cached, the form
+        is not rendered again.
+
+        .. versionadded:: 0.9
+
+        :param step:
+            The :class:`Step` to prepare.
+        """
+        prepared = (step.slug, step.form) in self._step_info
+        self.get_step_info(step)
+        get_display_fields(step.form)
+        form = step.form()
+        template_name = self.get_template(self.get_warmup_request(), step, form)
+
+        if prepared and self._get_template_key(template_name) in \
+                self._templates:
+            return
+
+        self._get_template(template_name)
+        unicode(form)
+
     def process_show_form(self, request, step, form):
         """
         Hook used for providing extra context that can be used in the
@@ -431,11 +1331,13 @@ class SessionWizard(object):
     def get_template(self, request, step, form):
         """
         Responsible for return the path to the template that should be used
-        to render this current form.
+        to render this current form, or a list of paths to use the first
+        template that exists.
 
         :param request:
             A ``HttpRequest`` object that carries along with it the session
-            used to access the wizard state.
+            used to access the wizard state. When the templates are loaded
+            ahead of time it is the request of :meth:`get_warmup_request`.
 
         :param step:
             The current :class:`Step` that is being processed.
@@ -445,12 +1347,61 @@ class SessionWizard(object):
         """
         return 'forms/wizard.html'
 
+    def get_fragment_template(self, request, step, form):
+        """
+        Returns the path to the template used to render only the form of the
+        current step, for requests that ask for a fragment. It is the path
+        returned by :meth:`get_template` with ``_fragment`` added to the file
+        name, ``forms/wizard_fragment.html`` by default, or the list of them
+        when it returns a list.
+
+        .. versionadded:: 0.9
+
+        :param request:
+            A ``HttpRequest`` object that carries along with it the session
+            used to access the wizard state.
+
+        :param step:
+            The current :class:`Step` that is being processed.
+
+        :param form:
+            The Django ``Form`` object that is being processed.
+        """
+        template_name = self.get_template(request, step, form)
+
+        if isinstance(template_name, (list, tuple)):
+            return [self._get_fragment_name(name) for name in template_name]
+
+        return self._get_fragment_name(template_name)
+
+    def _get_fragment_name(self, template_name):
+        root, ext = os.path.splitext(template_name)
+
+        return '%s_fragment%s' % (root, ext)
+
+    def is_fragment(self, request):
+        """
+        Returns whether the request asks for the form of the step alone
+        rather than the full page, which it does by sending the
+        ``X-Merlin-Fragment`` header.
+
+        .. versionadded:: 0.9
+
+        :param request:
+            A ``HttpRequest`` object for this request.
+        """
+        return bool(request.META.get(FRAGMENT_HEADER, None))
+
     def render_form(self, request, step, form, context):
         """
         Renders a form with the provided context and returns a ``HttpResponse``
         object. This can be overridden to provide custom rendering to the
         client or using a different template engine.
 
+        Requests that ask for a fragment get the template of
+        :meth:`get_fragment_template` instead, and the position of the step
+        and the URLs of its neighbours in ``X-Merlin-*`` headers.
+
         :param request:
             A ``HttpRequest`` object that carries along with it the session
             used to access the wizard state.
@@ -465,8 +1416,33 @@ class SessionWizard(object):
             The default context that templates can use which also contains
             any extra context created in the ``process_show_form`` hook.
         """
-        return render_to_response(self.get_template(request, step, form),
-            context, RequestContext(request))
+        fragment = self.is_fragment(request)
+
+        if fragment:
+            template_name = self.get_fragment_template(request, step, form)
+
+        else:
+            template_name = self.get_template(request, step, form)
+
+        template = self._get_template(template_name)
+        context_instance = RequestContext(request)
+        context_instance.update(context)
+        response = HttpResponse(template.render(context_instance))
+        patch_vary_headers(response, ('X-Merlin-Fragment',))
+
+        if fragment:
+            navigation = context['navigation']
+            response['X-Merlin-Step'] = step.slug
+            response['X-Merlin-Step-Number'] = str(navigation.number)
+            response['X-Merlin-Step-Total'] = str(navigation.total)
+
+            if navigation.previous_url:
+                response['X-Merlin-Previous'] = navigation.previous_url
+
+            if navigation.next_url:
+                response['X-Merlin-Next'] = navigation.next_url
+
+        return response
 
     def done(self, request):
         """
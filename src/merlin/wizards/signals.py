@@ -0,0 +1,8 @@
+from django.dispatch import Signal
+
+
+# Sent by the SignalMetricsSink for every timed phase of a wizard request.
+timing = Signal(providing_args=['name', 'duration', 'tags'])
+
+# Sent by the SignalMetricsSink for every size measured by a wizard.
+gauge = Signal(providing_args=['name', 'value', 'tags'])
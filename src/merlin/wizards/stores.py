@@ -0,0 +1,637 @@
+import base64
+import cPickle as pickle
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.hashcompat import md5_constructor
+from django.utils.html import conditional_escape
+from django.utils.http import base36_to_int, int_to_base36, urlquote
+from django.utils.importlib import import_module
+from django.utils.safestring import mark_safe
+
+from merlin.models import WizardEvent, WizardSnapshot
+from merlin.wizards import StateConflictException
+from merlin.wizards.utils import import_class
+
+
+__all__ = ('BaseStateStore', 'SessionStateStore', 'CacheStateStore',
+    'SignedCookieStateStore', 'EventLogStateStore', 'get_state_store',)
+
+
+def get_state_store():
+    """
+    Returns a new instance of the state store class set in the
+    ``MERLIN_STATE_STORE`` setting, :class:`SessionStateStore` by default.
+    """
+    return import_class(getattr(settings, 'MERLIN_STATE_STORE',
+        'merlin.wizards.stores.SessionStateStore'))()
+
+
+def _get_session_key(request):
+    """
+    Returns the session key of the request, making sure a new session gets
+    saved so its key is sent to the client.
+    """
+    session_key = request.session.session_key
+
+    # The key of a new session is only sent to the client when the session
+    # is saved, which only happens when it is modified.
+    if session_key != request.COOKIES.get(settings.SESSION_COOKIE_NAME, None):
+        request.session.modified = True
+
+    return session_key
+
+
+def _dumps(value):
+    return base64.b64encode(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+def _loads(data):
+    return pickle.loads(base64.b64decode(data))
+
+
+class BaseStateStore(object):
+    """
+    A state store loads and saves the :ref:`WizardState <api_wizardstate>`
+    of a wizard for the session of a request. Saving is a compare-and-swap on
+    the ``version`` of the state: when another request saved the state since
+    it was loaded, the changes recorded on the state are replayed on the newer
+    version instead of overwriting it.
+
+    .. versionadded:: 0.9
+    """
+    # Whether the store keeps its data in the session of the request.
+    uses_session = True
+
+    def load(self, request, wizard_id):
+        """
+        Returns the saved :class:`WizardState` or ``None`` if there is none.
+        """
+        raise NotImplementedError
+
+    def save(self, request, wizard_id, state):
+        """
+        Saves the state and returns the :class:`WizardState` that was saved,
+        which is a different object when changes had to be merged.
+        """
+        raise NotImplementedError
+
+    def delete(self, request, wizard_id):
+        """
+        Removes the saved state.
+        """
+        raise NotImplementedError
+
+    def get_form_field(self, request, wizard_id):
+        """
+        Returns the HTML of any hidden field the form of a step needs to carry
+        the state, an empty string by default.
+        """
+        return ''
+
+    def process_response(self, request, wizard_id, response):
+        """
+        Hook called with the response of every wizard request, for stores
+        that keep the state on the client.
+        """
+        pass
+
+    def merge(self, state, latest):
+        """
+        Replays the changes recorded on ``state`` on the ``latest`` saved
+        state. Changes to different steps merge cleanly; a change that can
+        not be applied anymore, like inserting a step next to a step that was
+        removed, raises a ``StateConflictException``.
+        """
+        if latest is None:
+            return state
+
+        for change in state.changes:
+            try:
+                latest.apply(change)
+
+            except ValueError:
+                raise StateConflictException(
+                    "Unable to apply %s to the wizard state." % change[0])
+
+        for name, value in state.items():
+            if name not in latest:
+                latest[name] = value
+
+        return latest
+
+
+class SessionStateStore(BaseStateStore):
+    """
+    Keeps the state in the Django session, the default. The session is
+    written as a whole by the session middleware, so when two requests change
+    the same wizard at the same time the last one to finish wins.
+
+    With ``verify``, the copy of the session persisted by the session engine
+    is read back before saving to check the version, so changes made by
+    another tab are merged instead of lost. This costs one more read of the
+    session per saving request and still leaves a window between the check
+    and the write: only the :class:`CacheStateStore` and the
+    :class:`EventLogStateStore` make the check atomic.
+
+    :param verify:
+        Whether to read the persisted state back before saving. Defaults to
+        the ``MERLIN_SESSION_STATE_VERIFY`` setting, ``False`` if not set.
+    """
+    def __init__(self, verify=None):
+        self.engine = import_module(settings.SESSION_ENGINE)
+
+        if verify is None:
+            verify = getattr(settings, 'MERLIN_SESSION_STATE_VERIFY', False)
+
+        self.verify = verify
+
+    def _get_loaded_versions(self, request):
+        if not hasattr(request, '_merlin_versions'):
+            request._merlin_versions = {}
+
+        return request._merlin_versions
+
+    def _load_persisted(self, request, wizard_id):
+        session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME, None)
+
+        # A session that was created by this request has nothing persisted.
+        if not session_key or session_key != request.session.session_key:
+            return None
+
+        return self.engine.SessionStore(session_key).load().get(wizard_id)
+
+    def load(self, request, wizard_id):
+        state = request.session.get(wizard_id, None)
+        self._get_loaded_versions(request)[wizard_id] = getattr(state,
+            'version', None)
+
+        # The wizard changes a copy, the session only sees the state once it
+        # is saved.
+        if state is not None:
+            state = state.copy()
+
+        return state
+
+    def save(self, request, wizard_id, state):
+        # The session is only written at the end of the request, so a save
+        # compares against the version loaded at the start of it.
+        loaded = self._get_loaded_versions(request).get(wizard_id, None)
+        persisted = None
+
+        if self.verify:
+            persisted = self._load_persisted(request, wizard_id)
+
+        if persisted is not None and persisted.version != loaded:
+            state = self.merge(state, persisted)
+            state.version = persisted.version + 1
+
+        else:
+            state.version = (loaded or 0) + 1
+
+        request.session[wizard_id] = state
+        request.session.modified = True
+
+        return state
+
+    def delete(self, request, wizard_id):
+        if wizard_id in request.session:
+            del request.session[wizard_id]
+
+
+class CacheStateStore(BaseStateStore):
+    """
+    Keeps the state in the Django cache, outside of the session. Every
+    version of the state is written under its own key with ``cache.add``,
+    which only succeeds for the first writer, so two requests can never both
+    save the same version. The losing request merges its changes into the
+    winning version and tries again, up to ``retries`` times.
+
+    :param timeout:
+        How long the state is kept in the cache. Defaults to the
+        ``SESSION_COOKIE_AGE`` setting.
+
+    :param retries:
+        How many times a save is attempted before a
+        ``StateConflictException`` is raised.
+    """
+    def __init__(self, timeout=None, retries=3):
+        self.timeout = timeout or settings.SESSION_COOKIE_AGE
+        self.retries = retries
+
+    def _key(self, request, wizard_id, version=None):
+        key = 'merlin.state.%s.%s' % (_get_session_key(request), wizard_id)
+
+        if version is not None:
+            key = '%s.%d' % (key, version)
+
+        return key
+
+    def load(self, request, wizard_id):
+        version = cache.get(self._key(request, wizard_id), None)
+
+        if version is None:
+            return None
+
+        # The head key is written after the version itself, so it can lag
+        # behind by one when another request is saving right now.
+        while True:
+            current = self._key(request, wizard_id, version)
+            following = self._key(request, wizard_id, version + 1)
+            found = cache.get_many([current, following])
+
+            if following not in found:
+                return found.get(current, None)
+
+            version += 1
+
+    def save(self, request, wizard_id, state):
+        for attempt in range(self.retries):
+            state.version += 1
+
+            if cache.add(self._key(request, wizard_id, state.version), state,
+                    self.timeout):
+                cache.set(self._key(request, wizard_id), state.version,
+                    self.timeout)
+                cache.delete(self._key(request, wizard_id, state.version - 1))
+                state.changes = []
+
+                return state
+
+            state.version -= 1
+            state = self.merge(state, self.load(request, wizard_id))
+
+        raise StateConflictException(
+            "Unable to save the wizard state after %d attempts." % self.retries)
+
+    def delete(self, request, wizard_id):
+        version = cache.get(self._key(request, wizard_id), None)
+
+        if version is not None:
+            cache.delete_many([self._key(request, wizard_id),
+                self._key(request, wizard_id, version)])
+
+
+class SignedCookieStateStore(BaseStateStore):
+    """
+    Keeps the state on the client. The state is pickled, compressed and signed
+    with the ``SECRET_KEY`` along with the time it was saved, then sent back
+    in a cookie, so no server side storage is written at all. A state that
+    fails the signature check, or that is older than ``max_age``, is ignored
+    and the wizard starts over.
+
+    For clients without cookies the state is also sent in a hidden form field
+    and added to the URL of the redirects that follow a post. The field is
+    rendered from the state saved at the end of the request, and only states
+    signed by the server are ever sent back.
+
+    When the encoded state is larger than ``max_size`` it is saved in the
+    ``fallback`` store instead and the client only carries a marker.
+
+    The signed state is unpickled, so anyone who knows the ``SECRET_KEY`` can
+    run code on the server through it. Keep the key secret and ``max_age``
+    short.
+
+    :param max_size:
+        The largest encoded state in bytes kept on the client. Defaults to
+        the ``MERLIN_STATELESS_MAX_SIZE`` setting or 3800 bytes, which keeps
+        the cookie under the 4KB browsers accept.
+
+    :param fallback:
+        The store used for states that are too large, a
+        :class:`SessionStateStore` by default.
+
+    :param max_age:
+        How many seconds a signed state stays valid. Defaults to the
+        ``MERLIN_STATELESS_MAX_AGE`` setting or the ``SESSION_COOKIE_AGE``.
+    """
+    uses_session = False
+
+    # The name of the hidden form field and URL parameter carrying the state.
+    field_name = 'merlin_state'
+
+    # The value sent to the client when the state is in the fallback store.
+    server_marker = 'server'
+
+    def __init__(self, max_size=None, fallback=None, max_age=None):
+        self.max_size = max_size
+        self.fallback = fallback or SessionStateStore()
+        self.max_age = max_age
+
+    def _get_tokens(self, request):
+        # The tokens saved by this request, or None for deleted states.
+        if not hasattr(request, '_merlin_tokens'):
+            request._merlin_tokens = {}
+
+        return request._merlin_tokens
+
+    def _get_verified_tokens(self, request):
+        # The tokens sent by the client that passed the signature check.
+        if not hasattr(request, '_merlin_verified_tokens'):
+            request._merlin_verified_tokens = {}
+
+        return request._merlin_verified_tokens
+
+    def _cookie_name(self, wizard_id):
+        return 'merlin_%s' % md5_constructor(wizard_id).hexdigest()[:12]
+
+    def _field_placeholder(self, wizard_id):
+        return 'merlin-state-%s' % md5_constructor(wizard_id).hexdigest()
+
+    def _signature(self, wizard_id, payload):
+        return salted_hmac('merlin.wizards.stores.SignedCookieStateStore',
+            '%s:%s' % (wizard_id, payload)).hexdigest()
+
+    def encode(self, wizard_id, state):
+        """
+        Returns the signed token for the state.
+        """
+        payload = '%s:%s' % (base64.urlsafe_b64encode(zlib.compress(
+            pickle.dumps(state, pickle.HIGHEST_PROTOCOL))),
+            int_to_base36(int(time.time())))
+
+        return '%s:%s' % (payload, self._signature(wizard_id, payload))
+
+    def decode(self, wizard_id, token):
+        """
+        Returns the state in the signed token, or ``None`` when the token is
+        not valid or has expired.
+        """
+        try:
+            payload, signature = str(token).rsplit(':', 1)
+            data, timestamp = payload.rsplit(':', 1)
+            timestamp = base36_to_int(timestamp)
+
+        except (ValueError, UnicodeEncodeError):
+            return None
+
+        if not constant_time_compare(signature,
+                self._signature(wizard_id, payload)):
+            return None
+
+        max_age = self.max_age or getattr(settings,
+            'MERLIN_STATELESS_MAX_AGE', settings.SESSION_COOKIE_AGE)
+
+        if time.time() - timestamp > max_age:
+            return None
+
+        return pickle.loads(zlib.decompress(base64.urlsafe_b64decode(data)))
+
+    def _get_client_token(self, request, wizard_id):
+        return request.COOKIES.get(self._cookie_name(wizard_id), None) or \
+            request.POST.get(self.field_name, None) or \
+            request.GET.get(self.field_name, None)
+
+    def _get_token(self, request, wizard_id):
+        """
+        Returns the token saved by this request, or else the token sent by
+        the client if it passed the signature check.
+        """
+        tokens = self._get_tokens(request)
+
+        if wizard_id in tokens:
+            return tokens[wizard_id]
+
+        return self._get_verified_tokens(request).get(wizard_id, None)
+
+    def load(self, request, wizard_id):
+        token = self._get_client_token(request, wizard_id)
+
+        if not token:
+            return None
+
+        if token == self.server_marker:
+            state = self.fallback.load(request, wizard_id)
+
+        else:
+            state = self.decode(wizard_id, token)
+
+        if state is not None:
+            self._get_verified_tokens(request)[wizard_id] = token
+
+        return state
+
+    def save(self, request, wizard_id, state):
+        state.version += 1
+        token = self.encode(wizard_id, state)
+
+        max_size = self.max_size or getattr(settings,
+            'MERLIN_STATELESS_MAX_SIZE', 3800)
+
+        if len(token) > max_size:
+            state.version -= 1
+            state = self.fallback.save(request, wizard_id, state)
+            token = self.server_marker
+
+        elif self._get_token(request, wizard_id) == self.server_marker:
+            self.fallback.delete(request, wizard_id)
+
+        state.changes = []
+        self._get_tokens(request)[wizard_id] = token
+
+        return state
+
+    def delete(self, request, wizard_id):
+        if self._get_token(request, wizard_id) == self.server_marker:
+            self.fallback.delete(request, wizard_id)
+
+        self._get_tokens(request)[wizard_id] = None
+
+    def get_form_field(self, request, wizard_id):
+        """
+        Returns the hidden field carrying the state. The field is rendered
+        before the state is saved, so it holds a placeholder that
+        :meth:`process_response` replaces with the saved token.
+        """
+        return mark_safe('<input type="hidden" name="%s" value="%s" />' % (
+            self.field_name, self._field_placeholder(wizard_id)))
+
+    def process_response(self, request, wizard_id, response):
+        token = self._get_token(request, wizard_id)
+        placeholder = self._field_placeholder(wizard_id)
+
+        if placeholder in response.content:
+            response.content = response.content.replace(placeholder,
+                conditional_escape(token or ''))
+
+        if token and response.has_header('Location') and \
+                self._cookie_name(wizard_id) not in request.COOKIES:
+            # The client does not keep cookies, so the state follows the
+            # redirect in the URL.
+            location = response['Location']
+            response['Location'] = '%s%s%s=%s' % (location,
+                '?' in location and '&' or '?', self.field_name,
+                urlquote(token))
+
+        tokens = self._get_tokens(request)
+
+        if wizard_id not in tokens:
+            return
+
+        if tokens[wizard_id]:
+            response.set_cookie(self._cookie_name(wizard_id), tokens[wizard_id],
+                httponly=True)
+
+        else:
+            response.delete_cookie(self._cookie_name(wizard_id))
+
+
+class EventLogStateStore(BaseStateStore):
+    """
+    Keeps the state in the database as an append-only log. Every save
+    appends one small :class:`~merlin.models.WizardEvent` holding the changes
+    recorded on the state instead of rewriting the whole state, and every
+    ``snapshot_interval`` events the complete state is written as a
+    :class:`~merlin.models.WizardSnapshot`. Loading replays the events that
+    follow the latest snapshot.
+
+    The sequence number of an event is unique per wizard and session, so when
+    two requests append the same sequence the database rejects the second
+    one, which then merges its changes into the newer state and tries again.
+    Use a database with savepoint support so the rejected insert does not
+    break the surrounding transaction.
+
+    Attributes added to the state, like the ones set in
+    :meth:`~SessionWizard.initialize()`, are only saved with the snapshots.
+
+    :param snapshot_interval:
+        The number of events between snapshots. Defaults to the
+        ``MERLIN_SNAPSHOT_INTERVAL`` setting or 20.
+
+    :param keep_history:
+        Keep the events older than the latest snapshot, to be able to replay
+        the history of a wizard with :meth:`get_history`. By default they are
+        deleted when a snapshot is written. The events are kept when the
+        state is deleted as well, and a wizard started again appends to them.
+
+    :param retries:
+        How many times a save is attempted before a
+        ``StateConflictException`` is raised.
+    """
+    def __init__(self, snapshot_interval=None, keep_history=False, retries=3):
+        self.snapshot_interval = snapshot_interval
+        self.keep_history = keep_history
+        self.retries = retries
+
+    def _filter(self, model, session_key, wizard_id):
+        return model.objects.filter(session_key=session_key,
+            wizard_id=wizard_id)
+
+    def _append(self, model, **kwargs):
+        savepoint = transaction.savepoint()
+
+        try:
+            model.objects.create(**kwargs)
+
+        except IntegrityError:
+            transaction.savepoint_rollback(savepoint)
+
+            return False
+
+        transaction.savepoint_commit(savepoint)
+
+        return True
+
+    def _get_last_sequence(self, session_key, wizard_id):
+        if not self.keep_history:
+            return 0
+
+        return self._filter(WizardEvent, session_key, wizard_id).aggregate(
+            last=Max('sequence'))['last'] or 0
+
+    def _compact(self, session_key, wizard_id, state):
+        self._append(WizardSnapshot, session_key=session_key,
+            wizard_id=wizard_id, sequence=state.version, data=_dumps(state))
+        self._filter(WizardSnapshot, session_key, wizard_id).filter(
+            sequence__lt=state.version).delete()
+
+        if not self.keep_history:
+            self._filter(WizardEvent, session_key, wizard_id).filter(
+                sequence__lte=state.version).delete()
+
+    def load(self, request, wizard_id):
+        session_key = _get_session_key(request)
+        snapshots = self._filter(WizardSnapshot, session_key,
+            wizard_id).order_by('-sequence')[:1]
+
+        if not snapshots:
+            return None
+
+        state = _loads(snapshots[0].data)
+        events = self._filter(WizardEvent, session_key, wizard_id).filter(
+            sequence__gt=state.version)
+
+        for event in events:
+            for change in _loads(event.data):
+                state.apply(change)
+
+            state.version = event.sequence
+
+        state.changes = []
+
+        return state
+
+    def save(self, request, wizard_id, state):
+        session_key = _get_session_key(request)
+        interval = self.snapshot_interval or getattr(settings,
+            'MERLIN_SNAPSHOT_INTERVAL', 20)
+
+        for attempt in range(self.retries):
+            if state.version and not state.changes:
+                return state
+
+            if not state.version:
+                # A new state starts the log with a snapshot, after the events
+                # kept from an earlier run of the wizard.
+                state.version = self._get_last_sequence(session_key,
+                    wizard_id) + 1
+                saved = self._append(WizardSnapshot, session_key=session_key,
+                    wizard_id=wizard_id, sequence=state.version,
+                    data=_dumps(state))
+
+                if not saved:
+                    state.version = 0
+
+            else:
+                names = ','.join([name for name, args in state.changes])
+                saved = self._append(WizardEvent, session_key=session_key,
+                    wizard_id=wizard_id, sequence=state.version + 1,
+                    names=names[:255], data=_dumps(state.changes))
+
+                if saved:
+                    state.version += 1
+
+            if saved:
+                state.changes = []
+
+                if state.version % interval == 0:
+                    self._compact(session_key, wizard_id, state)
+
+                return state
+
+            state = self.merge(state, self.load(request, wizard_id))
+
+        raise StateConflictException(
+            "Unable to save the wizard state after %d attempts." % self.retries)
+
+    def delete(self, request, wizard_id):
+        session_key = _get_session_key(request)
+
+        self._filter(WizardSnapshot, session_key, wizard_id).delete()
+
+        if not self.keep_history:
+            self._filter(WizardEvent, session_key, wizard_id).delete()
+
+    def get_history(self, session_key, wizard_id):
+        """
+        Returns a list of ``(sequence, created, changes)`` tuples for the
+        events still in the log, oldest first, to help find out what
+        happened to a wizard.
+        """
+        return [(event.sequence, event.created, _loads(event.data))
+            for event in self._filter(WizardEvent, session_key, wizard_id)]
@@ -0,0 +1,166 @@
+import threading
+from multiprocessing.pool import ThreadPool
+
+from django import forms
+from django.conf import settings
+from django.core.files.base import File
+from django.db import connection
+from django.forms.forms import pretty_name
+from django.forms.models import ModelChoiceField
+from django.template.defaultfilters import yesno
+from django.utils.encoding import force_unicode
+
+
+__all__ = ('get_display_fields', 'summarize_step', 'map_steps',)
+
+
+_fields = {}
+_lock = threading.Lock()
+_pools = {}
+
+
+def _get_choices(field):
+    choices = {}
+
+    for value, label in field.choices:
+        if isinstance(label, (list, tuple)):
+            choices.update((force_unicode(option), option_label)
+                for option, option_label in label)
+
+        else:
+            choices[force_unicode(value)] = label
+
+    return choices
+
+
+def _display_value(value):
+    if value is None:
+        return u''
+
+    if isinstance(value, File):
+        return force_unicode(value.name)
+
+    if isinstance(value, (list, tuple)):
+        return u', '.join(_display_value(item) for item in value)
+
+    return force_unicode(value)
+
+
+def _get_display(field):
+    if isinstance(field, forms.ChoiceField) and \
+            not isinstance(field, ModelChoiceField):
+        choices = _get_choices(field)
+
+        def display(value):
+            if isinstance(value, (list, tuple)):
+                return u', '.join(force_unicode(choices.get(
+                    force_unicode(item), item)) for item in value)
+
+            if value is None:
+                return u''
+
+            return force_unicode(choices.get(force_unicode(value), value))
+
+        return display
+
+    if isinstance(field, forms.BooleanField):
+        return yesno
+
+    return _display_value
+
+
+def get_display_fields(form):
+    """
+    Returns the ``(name, label, display)`` triples describing the fields of
+    the provided form class, where ``display`` turns a cleaned value into
+    the text shown to the user: the label of the chosen choices, yes or no,
+    the name of a file. They are computed once per form class from its
+    declared fields.
+
+    .. versionadded:: 0.9
+
+    :param form:
+        The form class to describe.
+    """
+    fields = _fields.get(form, None)
+
+    if fields is None:
+        fields = _fields[form] = tuple((name,
+            field.label if field.label is not None else pretty_name(name),
+            _get_display(field)) for name, field in form.base_fields.items())
+
+    return fields
+
+
+def summarize_step(step, data):
+    """
+    Returns the answers given to the provided :class:`Step` as a ``dict``
+    with the ``step`` and the list of its ``fields``, each a ``dict`` with
+    the ``name``, the ``label``, the cleaned ``value`` and its ``display``
+    text. The cleaned ``data`` is used as it is, without building the form.
+
+    .. versionadded:: 0.9
+
+    :param step:
+        The completed :class:`Step`.
+
+    :param data:
+        The cleaned data of the step.
+    """
+    data = data or {}
+
+    return {
+        'step': step,
+        'fields': [{
+            'name': name,
+            'label': label,
+            'value': data.get(name, None),
+            'display': display(data.get(name, None)),
+        } for name, label, display in get_display_fields(step.form)
+            if name in data],
+    }
+
+
+def _get_pool():
+    workers = getattr(settings, 'MERLIN_SUMMARY_WORKERS', 0)
+
+    if not workers:
+        return None
+
+    with _lock:
+        pool = _pools.get(workers, None)
+
+        if pool is None:
+            pool = _pools[workers] = ThreadPool(workers)
+
+    return pool
+
+
+def _closing(func):
+    def wrapper(step):
+        try:
+            return func(step)
+
+        finally:
+            # The pool threads open their own connections when the values
+            # are looked up in the database.
+            connection.close()
+
+    return wrapper
+
+
+def map_steps(func, steps):
+    """
+    Returns the list of the results of calling ``func`` with each of the
+    ``steps``, in order. The calls run at the same time in a pool of
+    ``MERLIN_SUMMARY_WORKERS`` threads when the setting is set, and one
+    after the other in the calling thread otherwise.
+
+    .. versionadded:: 0.9
+    """
+    pool = _get_pool()
+
+    if pool is None or len(steps) < 2:
+        return [func(step) for step in steps]
+
+    return pool.map(_closing(func), steps)
@@ -1,9 +1,11 @@
-from UserDict import UserDict
+import copy_reg
+import weakref
 
 from django import forms
+from django.utils.importlib import import_module
 
 
-__all__ = ('Step', 'WizardState',)
+__all__ = ('Step', 'SummaryStep', 'WizardState', 'Navigation',)
 
 
 class Step(object):
@@ -31,18 +33,72 @@ class Step(object):
         class to create instances for the user. If going back in the wizard
         process, the :ref:`SessionWizard <api_sessionwizard>` will prepopulate
         the form with any cleaned data already collected.
+
+    :param initial:
+        An optional function called with the request and the wizard that
+        returns the initial data of the form, for example from the profile of
+        the user, or ``None``.
+
+    :param resolvable:
+        ``True``, or an optional function called with the request, the wizard
+        and the initial data that returns whether the step can be completed
+        without the user. When it can and the initial data is valid, the
+        wizard stores it and skips the step.
+
+    .. versionchanged:: 0.9
+       Added the ``initial`` and ``resolvable`` arguments. Steps are pickled
+       with the wizard state, so like the form they must be module level
+       functions.
     """
-    def __init__(self, slug, form):
+    __slots__ = ('slug', 'form', 'initial', 'resolvable', '__weakref__',)
+
+    def __init__(self, slug, form, initial=None, resolvable=None):
         if not issubclass(form, (forms.Form, forms.ModelForm,)):
             raise ValueError('Form must be subclass of a Django Form')
 
         self.slug = str(slug)
         self.form = form
+        self.initial = initial
+        self.resolvable = resolvable
+
+        _steps.setdefault((type(self), self.slug, form, initial, resolvable),
+            self)
+
+    def __reduce__(self):
+        # Subclasses may take other arguments and set other attributes, so
+        # only the steps of this module are rebuilt from the shared ones.
+        if type(self) not in (Step, SummaryStep):
+            return (copy_reg.__newobj__, (type(self),), self.__getstate__())
+
+        args = (self.slug, self.form, self.initial, self.resolvable)
+
+        if type(self) is not Step:
+            args += (type(self),)
+
+        return (_get_step, args)
+
+    def __getstate__(self):
+        state = dict(getattr(self, '__dict__', {}))
+
+        for name in Step.__slots__[:-1]:
+            state[name] = getattr(self, name)
+
+        return state
+
+    def __setstate__(self, state):
+        # Steps pickled before 0.9 carry their attributes in a dict.
+        self.initial = self.resolvable = None
+
+        for name, value in state.items():
+            setattr(self, name, value)
 
     def __hash__(self):
         return hash(self.slug)
 
     def __eq__(self, other):
+        if self is other:
+            return True
+
         if isinstance(other, Step):
             return self.__hash__() == other.__hash__()
 
@@ -61,14 +117,62 @@ class Step(object):
         return str(self)
 
 
-class WizardState(UserDict):
+class SummaryForm(forms.Form):
+    """
+    The form of a :class:`SummaryStep`, without any field, so posting it
+    confirms the answers.
+    """
+
+
+class SummaryStep(Step):
+    """
+    A :class:`Step` showing the answers given to the completed steps of the
+    wizard, usually just before :meth:`SessionWizard.done`. Its template
+    receives them as ``summary``, see :meth:`SessionWizard.get_summary`.
+
+    .. versionadded:: 0.9
+
+    :param slug:
+        The unique slug of the step.
+
+    :param form:
+        The form posted to confirm the answers, :class:`SummaryForm` by
+        default.
+    """
+    __slots__ = ()
+
+    def __init__(self, slug, form=SummaryForm, initial=None, resolvable=None):
+        super(SummaryStep, self).__init__(slug, form, initial, resolvable)
+
+
+# One Step object per class, slug, form and providers, shared by every wizard
+# state that uses it, so the steps of the states loaded from the store take no
+# extra memory.
+_steps = weakref.WeakValueDictionary()
+
+
+def _get_step(slug, form, initial=None, resolvable=None, cls=Step):
+    """
+    Returns the existing step of class ``cls`` made of the same arguments,
+    or a new one. Used to unpickle the steps.
+    """
+    step = _steps.get((cls, slug, form, initial, resolvable), None)
+
+    if step is None:
+        step = cls(slug, form, initial, resolvable)
+
+    return step
+
+
+class WizardState(dict):
     """
     This class provides the ability for a
     :ref:`SessionWizard <api_sessionwizard>` to keep track of the important
     state of a multi-step form. Instead of keeping track of the state through
-    :samp:`<input type="hidden">` fields, it subclasses the python ``UserDict``
-    object and stores its data in the properties ``steps``,``current_step``
-    and ``form_data``.
+    :samp:`<input type="hidden">` fields, it is a ``dict`` whose items can be
+    read and set as attributes, like ``steps``, ``current_step`` and
+    ``form_data``. Any other attribute set on the state, for example in
+    :meth:`~SessionWizard.initialize()`, is kept as an item as well.
 
     .. versionadded:: 0.1
 
@@ -83,10 +187,255 @@ class WizardState(UserDict):
         A ``dict`` of the cleaned form data collected to this point and
         referenced using the :ref:`Step <api_step>`'s slug as the key to
         the ``dict``
+
+    :param version:
+        The number of times this state has been saved. State stores use it
+        to detect that another request saved the state in the meantime.
+
+    .. versionchanged:: 0.9
+       Changes to the state are made through its methods, which record them
+       in ``changes`` so they can be replayed on a newer version of the
+       state.
     """
+    __slots__ = ('changes',)
+
     def __init__(self, *args, **kwargs):
-        UserDict.__init__(self, *args, **kwargs)
+        dict.__init__(self, *args, **kwargs)
+
+        for name, default in (('steps', None), ('current_step', None),
+                ('form_data', None), ('version', 0)):
+            self.setdefault(name, default)
+
+        object.__setattr__(self, 'changes', [])
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        if name == 'changes':
+            object.__setattr__(self, name, value)
+
+        else:
+            self[name] = value
+
+    def __delattr__(self, name):
+        try:
+            del self[name]
+
+        except KeyError:
+            raise AttributeError(name)
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+    def __setstate__(self, state):
+        # States pickled before 0.9 were UserDict objects with their values
+        # in attributes and an unused ``data`` dict.
+        self.update(state.pop('data', {}))
+        self.update(state)
+
+    def copy(self):
+        """
+        Returns a copy of the state whose step list and form data can be
+        changed without changing this state.
+        """
+        state = self.__class__(self)
+        state.changes = list(self.changes)
+
+        if self.steps is not None:
+            state.steps = list(self.steps)
+
+        if self.form_data is not None:
+            state.form_data = dict(self.form_data)
+
+        return state
+
+    def _record(self, name, *args):
+        self.changes.append((name, args))
+
+    def apply(self, change):
+        """
+        Applies a change recorded by another ``WizardState`` to this one.
+        """
+        name, args = change
+        getattr(self, name)(*args)
+
+    def set_cleaned_data(self, slug, data):
+        self.form_data[slug] = data
+        self._record('set_cleaned_data', slug, data)
+
+    def set_current_step(self, step):
+        self.current_step = step
+        self._record('set_current_step', step)
+
+    def remove_step(self, step):
+        if step in self.steps:
+            self.steps.remove(step)
+            self._record('remove_step', step)
+
+    def insert_before(self, current_step, step):
+        if step not in self.steps:
+            self.steps.insert(self.steps.index(current_step), step)
+            self._record('insert_before', current_step, step)
+
+    def insert_after(self, current_step, step):
+        if step not in self.steps:
+            self.steps.insert(self.steps.index(current_step) + 1, step)
+            self._record('insert_after', current_step, step)
+
+
+class Navigation(object):
+    """
+    Where the current :class:`Step` stands in the step list of a wizard,
+    computed once per request from the position of the step. Passed to the
+    templates as ``navigation``.
+
+    .. versionadded:: 0.9
+
+    :param steps:
+        The list of :class:`Step` objects of the wizard.
+
+    :param current_step:
+        The :class:`Step` being shown.
+
+    :param url_base:
+        The URL the step slugs are appended to.
+
+    :param form_data:
+        The cleaned form data collected so far, used to tell which steps are
+        completed.
+
+    :param url_suffix:
+        The part of the URLs that follows the step slug, if any.
+    """
+    def __init__(self, steps, current_step, url_base, form_data=None,
+            url_suffix=''):
+        form_data = form_data or {}
+
+        self.current_step = current_step
+        self.url_base = url_base
+        self.url_suffix = url_suffix
+        self.index = steps.index(current_step)
+        self.number = self.index + 1
+        self.total = len(steps)
+        self.percent = 100 * self.index // self.total
+
+        if self.index > 0:
+            self.previous = steps[self.index - 1]
+
+        else:
+            self.previous = None
+
+        if self.number < self.total:
+            self.next = steps[self.number]
+
+        else:
+            self.next = None
+
+        self.steps = [{
+            'step': step,
+            'number': index + 1,
+            'url': url_base + step.slug + url_suffix,
+            'current': index == self.index,
+            'completed': step.slug in form_data,
+        } for index, step in enumerate(steps)]
+
+    def get_url(self, step):
+        """
+        Returns the URL of the :class:`Step`, or ``None`` when there is no
+        step.
+        """
+        if step is None:
+            return None
+
+        return self.url_base + step.slug + self.url_suffix
+
+    @property
+    def previous_url(self):
+        return self.get_url(self.previous)
+
+    @property
+    def next_url(self):
+        return self.get_url(self.next)
+
+
+class UnitOfWork(object):
+    """
+    Collects what a request does to the state of one wizard so the state is
+    written at most once, when the response is returned, or not at all when
+    the request fails.
+
+    .. versionadded:: 0.9
+
+    :param store:
+        The state store of the wizard.
+
+    :param wizard_id:
+        The id of the wizard.
+
+    :param state:
+        The :class:`WizardState` loaded from the store, or ``None``.
+    """
+    def __init__(self, store, wizard_id, state):
+        self.store = store
+        self.wizard_id = wizard_id
+        self.state = state
+        self.dirty = False
+        self.deleted = False
+        self._on_commit = []
+        self._on_rollback = []
+
+    def on_commit(self, func, *args):
+        """
+        Calls ``func`` with ``args`` once the state has been written.
+        """
+        self._on_commit.append((func, args))
+
+    def on_rollback(self, func, *args):
+        """
+        Calls ``func`` with ``args`` when the changes are dropped.
+        """
+        self._on_rollback.append((func, args))
+
+    def _finish(self, callbacks):
+        for func, args in callbacks:
+            func(*args)
+
+        self._on_commit = []
+        self._on_rollback = []
+
+    def commit(self, request):
+        """
+        Writes the state to the store if it was changed or deleted.
+        """
+        if self.deleted:
+            self.store.delete(request, self.wizard_id)
+
+        elif self.dirty and self.state is not None:
+            self.state = self.store.save(request, self.wizard_id, self.state)
+
+        self.dirty = False
+        self.deleted = False
+        self._finish(self._on_commit)
+
+    def rollback(self):
+        """
+        Drops the changes, the state in the store is left untouched.
+        """
+        self.state = None
+        self.dirty = False
+        self.deleted = False
+        self._finish(self._on_rollback)
+
+
+def import_class(import_path):
+    """
+    Imports and returns the class at the provided dotted path.
+    """
+    module, attr = import_path.rsplit('.', 1)
 
-        self.steps = kwargs.get('steps', None)
-        self.current_step = kwargs.get('current_step', None)
-        self.form_data = kwargs.get('form_data', None)
+    return getattr(import_module(module), attr)